@@ -1,7 +1,12 @@
 from . import utils
+import re
 import time 
 import pandas as pd 
-from copy import deepcopy
+import numpy as np
+from copy import copy
+from functools import cached_property, wraps
+from itertools import chain, groupby
+from operator import itemgetter
 from .stopwords import stopwords
 from .regex import WORD_DELIM
 
@@ -14,9 +19,45 @@ OPERATORS = ['equals','notEquals','contains','notContains','includingRegex','exc
 SEARCH_TYPES = ['web', 'image', 'video', 'discover','googleNews','news']
 DATA_STATES = ['all','final']
 
+#dimensions with a few unique values, stored as categories in the reports
+CATEGORICAL_DIMENSIONS = ['country','device','searchAppearance']
+
 #this is not from the API but we'll use it to group data by period
 PERIODS = ['D','W','M','Q','Y','QE','ME']
 
+#days of the week, in the order used by seasonality_per_day
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+#decorator used by the Report methods to check that the report has 
+#the dimensions and the metrics they need before running them
+def requires(dimensions=[], metrics=[]):
+    #the requirements are stored as sets once, when the method is decorated
+    required_dimensions, required_metrics = frozenset(dimensions), frozenset(metrics)
+    
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            #the report has everything we need: no need to build the error messages
+            if required_dimensions.issubset(self.dimensions) and required_metrics.issubset(self.metrics):
+                return method(self, *args, **kwargs)
+            missing = [elem for elem in dimensions if elem not in self.dimensions]
+            if missing:
+                raise ValueError(f"Your report needs {' and '.join('a ' + elem for elem in missing)} dimension to call this method.")
+            missing = [elem for elem in metrics if elem not in self.metrics]
+            if len(missing) == 1:
+                raise ValueError(f'Your report needs {missing[0]} as a metric to call this method.')
+            if missing:
+                raise ValueError(f"Your report needs {', '.join(missing[:-1])} and {missing[-1]} metrics to call this method.")
+            return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+#map the values computed on the unique keys of a factorization back to the rows
+#pd.factorize gives the code -1 to the missing keys (nan page or query): 
+#these rows get fill_value (nan by default) instead of the value of the last key
+def take_by_codes(values, codes, fill_value=None):
+    return pd.api.extensions.take(np.asarray(values), codes, allow_fill=True, fill_value=fill_value)
+
 class Query:
     """
     Return a query for certain metrics and dimensions.
@@ -147,65 +188,81 @@ class Query:
     
     #method to retrieve the data
     def get(self):
-        #where we'll store our data 
-        report = []
-        #boooleans to control the flow 
-        is_complete = False
-        limit_achieved = False 
         #other information we'll need
         limit = self.meta.get('limit', float('inf'))
-        total_rows = 0
-
+        first_row = self.raw['startRow']
+        
+        #function to retrieve the page starting at start_row as a dataframe
+        #the requests are rate limited and retried if we reach the quota limits
+        def get_page(start_row):
+            request = self.service.searchanalytics().query(
+                siteUrl=self.webproperty, 
+                body=dict(self.raw, startRow=start_row)
+            )
+            rows = utils.execute_with_backoff(
+                request, 
+                http=utils.get_thread_http(request.http)
+            ).get('rows', [])
+            if not rows:
+                return pd.DataFrame()
+            #each page is converted as soon as we receive it 
+            #so we never keep the rows of the whole report as dicts
+            #the values of each row are extracted in a single itemgetter call and transposed into columns
+            #(the metrics are the ones returned by the API, after the keys with our dimensions)
+            metrics = [metric for metric in rows[0] if metric != 'keys']
+            keys, *values = zip(*map(itemgetter('keys', *metrics), rows))
+            return pd.DataFrame(
+                {
+                    **dict(zip(self.raw['dimensions'], zip(*keys))),
+                    **dict(zip(metrics, values))
+                }
+            )
+        
+        #we retrieve the first page alone, most reports fit in it
+        report = [get_page(first_row)]
+        
         #we continue to execute the request until we have all the data we need
         #this can be either because there is no more date 
         #or because we have reached the limit
-        while is_complete == False and limit_achieved == False:
-            #wait for 1 second to avoid reaching the quota limits 
-            #this is not 100% bulletproof but it should be enough for most use cases
-            #while having almost no impact on performance
-            time.sleep(1)
-            #retrieve the data 
-            chunk = self.service.searchanalytics().query(siteUrl=self.webproperty, body=self.raw).execute()
-            #add our data to the report list we'll return 
-            total_rows += len(chunk.get('rows', []))
-            report.append(chunk.get('rows', []))
-            #update the is_complete variable if we don't have more data 
-            if len(chunk.get('rows', []))<25000:
-                is_complete = True
-            #else, update the startRow in our request body 
-            else: 
-                self.raw.update({'startRow': self.raw['startRow'] + 25000})
-            #check if we've reached our limit
-            if total_rows >= limit:
-                limit_achieved = True
-        
-        #we flatten the list of lists we have 
-        flattened = pd.DataFrame([item for row in report for item in row])
+        #the next pages are requested by waves of concurrent requests
+        #the first wave is small and the size doubles while the pages keep coming back full
+        #(up to GSC_MAX_WORKERS), so small reports don't request many empty pages
+        executor = utils.get_gsc_executor()
+        wave_size = 2
+        while len(report[-1]) == 25000:
+            start_row = first_row + 25000 * len(report)
+            #we don't request pages beyond our limit 
+            start_rows = [
+                row 
+                for row in range(start_row, start_row + 25000 * wave_size, 25000)
+                if row - first_row < limit
+            ]
+            if not start_rows:
+                break
+            #all the pages of the wave are retrieved before we check them
+            for page in list(executor.map(get_page, start_rows)):
+                report.append(page)
+                #a page with less than 25000 rows is the last one, we ignore the ones after it
+                if len(page) < 25000:
+                    break
+            wave_size = min(2 * wave_size, utils.GSC_MAX_WORKERS)
+        
         #we check if we have no data 
         #raise an error instead of returning an empty dataframe to ensure the user is aware of the issue
         #linked to https://github.com/antoineeripret/gsc_wrapper/issues/9
-        if len(flattened) == 0:
+        pages = [page for page in report if len(page) > 0]
+        if not pages:
             raise ValueError('No data available. Check your request and ensure you\'re using the right dates and filters.')
 
-        #we create a dataframe from the keys we received from the API 
-        #this is the only way to get the data in a proper format 
-        #while not passing explicitly the dimensions we want 
-        df =   (
-            pd
-            .DataFrame(
-            flattened
-                ['keys']
-                .tolist(), 
-                columns = self.raw['dimensions']
-            )
-            .join(
-                flattened
-                .drop('keys', axis = 1)
-            )
-        )
-        
-        if limit != float('inf'):
-            df = df.head(limit)
+        #we keep only the rows within our limit 
+        #only the last page can go beyond it (the next ones are never requested)
+        #so it is truncated before the pages are concatenated, in a single copy 
+        extra_rows = sum(map(len, pages)) - limit
+        if extra_rows > 0:
+            pages[-1] = pages[-1].iloc[:len(pages[-1]) - extra_rows]
+        df = pd.concat(pages, ignore_index=True) if len(pages) > 1 else pages[0]
+        #the pages are not needed anymore
+        del report, pages
         
         #reset filter to prevent issue raised here https://github.com/antoineeripret/gsc_wrapper/issues/9 
         self.raw = {
@@ -229,14 +286,97 @@ class Report:
         self.webproperty = webproperty
         self.dimensions = [column for column in df.columns if column in DIMENSIONS]
         self.metrics = [column for column in df.columns if column not in DIMENSIONS]
+        self.df = df
         if 'date' in self.dimensions:
-            self.from_date = df.date.min()
-            self.to_date = df.date.max()
+            self.from_date = self.df.date.min().strftime('%Y-%m-%d')
+            self.to_date = self.df.date.max().strftime('%Y-%m-%d')
         else: 
             self.from_date = None
             self.to_date = None
             
-        self.df = df
+        #compiled brand patterns, keyed by the set of brand variants 
+        self._brand_patterns = {}
+        #urls of the sitemaps already downloaded, keyed by sitemap url
+        self._sitemap_urls = {}
+    
+    @property
+    def df(self):
+        return self._df
+    
+    @df.setter
+    def df(self, df):
+        columns = {}
+        #dates are parsed once here so the methods don't have to do it on each call
+        #(whatever the dtype of the strings: object, string or string[pyarrow])
+        if 'date' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['date']):
+            columns['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d', cache=True)
+        #dimensions with a handful of values are stored as categories (less memory, faster group-bys)
+        #the categories which are not used anymore (e.g. after a filter) are removed
+        for column in CATEGORICAL_DIMENSIONS:
+            if column not in df.columns:
+                continue
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                codes = df[column].cat.codes.to_numpy()
+                if not np.bincount(codes[codes >= 0], minlength=len(df[column].cat.categories)).all():
+                    columns[column] = df[column].cat.remove_unused_categories()
+            #strings can be stored as object, string or string[pyarrow]
+            elif pd.api.types.is_object_dtype(df[column]) or pd.api.types.is_string_dtype(df[column]):
+                columns[column] = df[column].astype('category')
+        #the report never shares the caller's dataframe: url_to_df adds its columns in place
+        #(assign already returns a new dataframe, otherwise a shallow copy is enough, the values are never modified)
+        self._df = df.assign(**columns) if columns else df.copy(deep=False)
+        #the cached factorizations were computed on the previous dataframe
+        for attribute in ['_page_codes', '_query_codes', '_date_codes', '_clicks_per_day']:
+            self.__dict__.pop(attribute, None)
+    
+    #factorizations of the page, query and date columns (codes, sorted uniques)
+    #computed once per dataframe and shared by the methods grouping on these columns
+    #the missing values get the code -1: like a groupby, the methods leave these rows out 
+    #of their aggregations (codes >= 0) and map them with take_by_codes
+    @cached_property
+    def _page_codes(self):
+        return pd.factorize(self.df['page'], sort=True)
+    
+    @cached_property
+    def _query_codes(self):
+        return pd.factorize(self.df['query'], sort=True)
+    
+    @cached_property
+    def _date_codes(self):
+        return pd.factorize(self.df['date'], sort=True)
+    
+    #daily clicks (date and clicks columns), used by forecast and causal_impact
+    @cached_property
+    def _clicks_per_day(self):
+        date_codes, dates = self._date_codes
+        return pd.DataFrame(
+            {
+                'date': dates,
+                'clicks': (
+                    np.bincount(date_codes, weights=self.df['clicks'].to_numpy(), minlength=len(dates))
+                    .astype(self.df['clicks'].dtype)
+                )
+            }
+        )
+    
+    #flag the rows with a branded query 
+    #the brand variants are compiled once (and reused on the next calls)
+    #and matched literally on the unique queries only
+    def _is_brand(self, brand_variants):
+        key = frozenset(brand_variants)
+        pattern = self._brand_patterns.get(key)
+        if pattern is None:
+            pattern = re.compile('|'.join(map(re.escape, brand_variants)))
+            self._brand_patterns[key] = pattern
+        codes, queries = self._query_codes
+        return take_by_codes(pd.Series(queries).str.contains(pattern).to_numpy(dtype=bool), codes, False)
+    
+    #download the urls of a sitemap once per report (and its copies)
+    #stored as a tuple so the cached list can't be modified by the caller
+    def _get_sitemap_urls(self, sitemap_url):
+        if sitemap_url not in self._sitemap_urls:
+            self._sitemap_urls[sitemap_url] = tuple(utils.get_urls_from_sitemap(sitemap_url))
+        return self._sitemap_urls[sitemap_url]
     
     @classmethod
     def from_dataframe(cls, df, webproperty):
@@ -262,94 +402,119 @@ class Report:
     def show_data(self):
         return self.df
     
+    #shallow copy of the report used by the methods returning a new Report
+    #they always assign a new dataframe to the copy, so self.df is never shared nor modified
+    #the dimensions and metrics lists are copied so they can be updated independently
+    #the compiled brand patterns and the sitemap urls don't depend on the data, these caches are shared on purpose
+    #(the cached factorizations are dropped by the df setter when the new dataframe is assigned)
+    def _copy(self):
+        self_copy = copy(self)
+        self_copy.dimensions = list(self.dimensions)
+        self_copy.metrics = list(self.metrics)
+        return self_copy
+    
+    #copy of the report with new columns added to its dataframe 
+    #the rows are the same, so the cached factorizations of the columns left untouched
+    #are kept instead of being computed again on the copy
+    def _assign(self, **columns):
+        self_copy = self._copy()
+        self_copy.df = self.df.assign(**columns)
+        for attribute, used_columns in [
+            ('_page_codes', ['page']), 
+            ('_query_codes', ['query']), 
+            ('_date_codes', ['date']), 
+            ('_clicks_per_day', ['date', 'clicks'])
+        ]:
+            if attribute in self.__dict__ and not any(column in columns for column in used_columns):
+                self_copy.__dict__[attribute] = self.__dict__[attribute]
+        return self_copy
+    
     #function to filter data 
     def filter(self, query):
-        self_copy = deepcopy(self)
-        self_copy.df = self_copy.df.query(query)
-        return deepcopy(self_copy) 
+        self_copy = self._copy()
+        self_copy.df = self.df.query(query)
+        return self_copy 
     
     #inspired by https://github.com/eliasdabbas/advertools
+    @requires(dimensions=['page'])
     def url_to_df(self):
-        if 'page' not in self.dimensions:
-            raise ValueError('Your report needs a page dimension to call this method.')
-                
-        #append folders to self.df horizontally 
-        self.df = (
-            pd
-            .concat(
-                [
-                    #generic info 
-                    self
-                    .df
-                    .assign(
-                        #get the scheme 
-                        scheme = lambda df_:df_['page'].apply(lambda x: x.split('://')[0]),
-                        #get the netloc 
-                        netloc = lambda df_:df_['page'].apply(lambda x: x.split('://')[1].split('/')[0]),
-                        #get the path 
-                        path = lambda df_:df_['page'].apply(lambda x: '/'+'/'.join(x.split('/')[3:])),
-                        #get the last folder 
-                        last_folder = lambda df_:df_['page'].apply(lambda x: x.split('/')[-1])
-                    ), 
-                    #folders
-                    self
-                    .df
-                    .page 
-                        .str.split("/", expand=True)
-                        #just from 3 to N 
-                        .iloc[:,3:]
-                        #rename columns by adding folder_ before the current name 
-                        .rename(columns=lambda x: 'folder_'+str(x-2))
-                ]
-            , axis=1)
+        #we split the unique URLs once 
+        #and map the parts back to the rows with the cached page codes
+        codes, pages = self._page_codes
+        pages = pd.Series(pages)
+        parts = pages.str.split('/', expand=True)
+        #number of parts of each URL (the missing parts are at the end of the rows)
+        n_parts = parts.notna().sum(axis=1).to_numpy()
+        urls = pd.DataFrame(
+            {
+                #get the scheme
+                'scheme': parts[0].str.rstrip(':'),
+                #get the netloc
+                'netloc': parts[2],
+                #get the path
+                'path': '/' + pages.str.split('/', n=3).str[3].fillna(''),
+                #get the last folder (last part of each URL)
+                'last_folder': parts.to_numpy()[np.arange(len(parts)), n_parts - 1],
+            }
         )
-        return self 
+
+        #folders
+        folders = (
+            parts
+            #just from 3 to N
+            .iloc[:,3:]
+            #rename columns by adding folder_ before the current name
+            .rename(columns=lambda x: f'folder_{x-2}')
+        )
+
+        #we add the columns one by one to self.df
+        #this avoids rebuilding the whole DataFrame with a concat (or a join), 
+        #which would copy all the existing columns: only the new columns are allocated
+        for column, values in [*urls.items(), *folders.items()]:
+            self.df[column] = take_by_codes(values, codes)
+        return self
     
         
     # method to create a CTR yield curve 
     # concept explained here : https://www.aeripret.com/ctr-yield-curve/
+    @requires(dimensions=['query', 'date'], metrics=['clicks', 'impressions', 'position'])
     def ctr_yield_curve(self):
-        
-        if not all(elem in self.dimensions for elem in ['query','date']):
-            raise ValueError('Your report needs a query and a date dimension to call this method.')
-        
-        if not all(elem in self.metrics for elem in ['clicks','impressions','position']):
-            raise ValueError('Your report needs clicks, impressions and position metrics to call this method.')
+        #round the position and remove rows where the position >10, data is irrelevant
+        position = np.round(self.df['position'].to_numpy())
+        keep = position <= 10
+        #calculate the weighted ctr by rounded position 
+        #with bincount calls on the position codes instead of a groupby
+        positions, codes = np.unique(position[keep], return_inverse=True)
+        totals = {
+            metric: (
+                np.bincount(codes, weights=self.df[metric].to_numpy()[keep], minlength=len(positions))
+                .astype(self.df[metric].dtype)
+            )
+            for metric in ['clicks', 'impressions']
+        }
+        #the number of keywords by position 
+        has_query = self.df['query'].notna().to_numpy()[keep]
         
         return (
-            self
-            .df 
-            #round the position 
-            .assign(
-                position = lambda df_: round(df_['position']),
-            )
-            #calculate the weighted ctr by rounded position 
-            .groupby('position', as_index = False)
-            .agg(
+            pd
+            .DataFrame(
                 {
-                    'clicks': 'sum', 
-                    'impressions': 'sum', 
-                    'query':'count'
+                    'position': positions, 
+                    **totals, 
+                    'kw_count': np.bincount(codes, weights=has_query, minlength=len(positions)).astype(np.int64)
                 }
             )
-            #remove rows where the position >10, data is irrelevant
-            .query('position <= 10')
-            #rename the query column to kw_count
-            .rename(columns = {'query': 'kw_count'})
             .assign(
                 ctr = lambda df_: round(df_['clicks'] *100 / df_['impressions'], 2) 
             )
             #keep only useful columns
-            .filter(items=['position', 'ctr','clicks','impressions','kw_count'])
+            .loc[:, ['position', 'ctr','clicks','impressions','kw_count']]
             .set_index('position')
         )
 
     #create a function to easily group data by period 
+    @requires(dimensions=['date'])
     def group_data_by_period(self, period):
-        #check if we have a date dimension
-        if 'date' not in self.dimensions:
-            raise ValueError('Your report needs a date dimension to call this method.')
-        
         #check tha the period is valid
         if period not in PERIODS:
             raise ValueError('Period not valid. You can only use D, W, M, ME, Q, QE or Y.')
@@ -359,16 +524,25 @@ class Report:
         if period in ['Q','M']: 
             period += 'E'
         
+        #the dates are parsed once when the report is created
+        #we sum the metrics by day on the cached date codes and resample these daily totals
+        #instead of resampling every row
+        date_codes, dates = self._date_codes
+        metrics = [metric for metric in ['clicks','impressions'] if metric in self.df.columns]
+        
         return (
-            self
-            .df
-            #we need to convert the date to a datetime object
-            .assign(
-                date = lambda df_: pd.to_datetime(df_['date']),
+            pd
+            .DataFrame(
+                {
+                    metric: (
+                        np.bincount(date_codes, weights=self.df[metric].to_numpy(), minlength=len(dates))
+                        .astype(self.df[metric].dtype)
+                    )
+                    for metric in metrics
+                },
+                index = pd.DatetimeIndex(dates, name='date')
             )
             #resample
-            .set_index('date')
-            .filter(items=['clicks','impressions'])
             .resample(period)
             .sum()
             .reset_index()
@@ -379,25 +553,18 @@ class Report:
 
     #funtion to know if a page is active (has clicks or has impressions)
     #from a list of URLs or a sitemap
+    @requires(dimensions=['page'], metrics=['clicks', 'impressions'])
     def active_pages(self,sitemap_url=None, urls=None):
-        
-        import numpy as np
-        
-        if 'page' not in self.dimensions:
-            raise ValueError('Your report needs a page dimension to call this method.')
-        
-        #check that we have both impressions and clicks 
-        if not all(elem in self.metrics for elem in ['clicks','impressions']):
-            raise ValueError('Your report needs clicks and impressions metrics to call this method.')
-        
         if urls and sitemap_url: 
             raise ValueError('Please provide either sitemap_url or urls')
         if not urls and not sitemap_url:
             raise ValueError('Please provide either sitemap_url or urls')
         #if we have a sitemap 
         if sitemap_url:
+            #check that we have a correct sitemap URL before downloading it
+            utils.check_sitemap_url(sitemap_url)
             #download the urls from the site map
-            urls = pd.DataFrame(utils.get_urls_from_sitemap(sitemap_url), columns=['loc'])
+            urls = pd.DataFrame(self._get_sitemap_urls(sitemap_url), columns=['loc'])
         #otherwlse, just parse the list of urls
         elif urls:
             urls = (
@@ -405,11 +572,25 @@ class Report:
                 .DataFrame(urls, columns=['loc'])
             )
         
+        #the metrics are summed by page on the cached page codes instead of grouping on the URLs
+        #(the order of the pages doesn't matter, the right merge keeps the order of the URLs)
+        codes, pages = self._page_codes
+        has_page = codes >= 0
+        
         return ( 
-            self
-            .df
-            .groupby('page', as_index=False)
-            .agg({'clicks': 'sum', 'impressions': 'sum'})
+            pd
+            .DataFrame(
+                {
+                    'page': pages,
+                    **{
+                        metric: (
+                            np.bincount(codes[has_page], weights=self.df[metric].to_numpy()[has_page], minlength=len(pages))
+                            .astype(self.df[metric].dtype)
+                        )
+                        for metric in ['clicks', 'impressions']
+                    }
+                }
+            )
             #merge with our list of URLS 
             .merge(
                 urls,
@@ -420,10 +601,11 @@ class Report:
                 #from our initial list of URLs
                 how = 'right'
             )
-            .filter(items=['page','clicks','impressions','loc'])
+            .loc[:, ['page','clicks','impressions','loc']]
             .assign(
-                active_impression = lambda df_:np.where(df_.page.isna(), False, True), 
-                active_clicks = lambda df_:df_.page.isin(df_.query('clicks>0').page.unique()), 
+                active_impression = lambda df_:df_['page'].notna(), 
+                #the clicks are already summed by page (nan if the page is not in our report)
+                active_clicks = lambda df_:df_['clicks'] > 0, 
                 page = lambda df_:df_['page'].fillna(df_['loc'])
             )
             .drop('loc', axis = 1)
@@ -432,79 +614,77 @@ class Report:
         )
 
     #inspired by https://github.com/jmelm93/seo_cannibalization_analysis 
+    @requires(dimensions=['query', 'page'], metrics=['clicks', 'impressions'])
     def cannibalization(self, brand_variants):
-        import numpy as np 
-        #check if we have the required dimensions 
-        if not all(elem in self.dimensions for elem in ['query','page']):
-            raise ValueError('Your report needs a query and a page dimension to call this method.')
-        
-        #check that we have clicks and impressions
-        if not all(elem in self.metrics for elem in ['clicks','impressions']):
-            raise ValueError('Your report needs clicks and impressions metrics to call this method.')
-        
         #remove branded queries 
-        df = (
-            self
-            .df
-            .groupby(['query','page'], as_index=False)
-            .agg({'clicks': 'sum', 'impressions': 'sum'})
-            #remove branded queries
-            .query('query.str.contains("|".join(@brand_variants))==False')
+        #and sum the metrics by query and page on the cached codes instead of grouping on the strings
+        #(the intermediate group-bys don't need sorted keys, the final one is still sorted)
+        query_codes, queries = self._query_codes
+        page_codes, pages = self._page_codes
+        is_kept = ~self._is_brand(brand_variants) & (query_codes >= 0) & (page_codes >= 0)
+        pairs, pair_codes = np.unique(
+            query_codes[is_kept] * len(pages) + page_codes[is_kept], 
+            return_inverse=True
+        )
+        df = pd.DataFrame(
+            {
+                'query': queries.take(pairs // len(pages)),
+                'page': pages.take(pairs % len(pages)),
+                **{
+                    metric: (
+                        np.bincount(pair_codes, weights=self.df[metric].to_numpy()[is_kept], minlength=len(pairs))
+                        .astype(self.df[metric].dtype)
+                    )
+                    for metric in ['clicks', 'impressions']
+                }
+            }
         )
         
         #create a separate df with the data per query
+        #(df has one row per query and page, so counting its pages gives the unique pages)
         df_query = (
             df 
-            .groupby('query', as_index=False)
+            .groupby('query', as_index=False, sort=False)
             .agg(
-                {'clicks': 'sum', 'page': 'nunique'}
+                {'clicks': 'sum', 'page': 'count'}
             )
             #at least two pages on the same query 
-            .query('page >= 2')
-            #at ñeast one click 
-            .query('clicks >= 1')
+            #and at least one click 
+            .loc[lambda df_: (df_['page'] >= 2) & (df_['clicks'] >= 1)]
         )
 
         #do the same for the pages 
         df_page = (
             df
-            .groupby('page', as_index=False)
+            .groupby('page', as_index=False, sort=False)
             .agg({'clicks': 'sum'})
         )
 
         #filter ou initial df based on that 
+        #df is already aggregated by query and page, we only need to sort it
         final = (
             df
-            .merge(
-                df_query[['query']], 
-                on = 'query',
-                how = 'inner'
-            )
-            .groupby(['page', 'query'], as_index = False)
-            .agg({
-                'clicks': 'sum',
-                'impressions': 'sum',
-            }) 
+            .loc[lambda df_: df_['query'].isin(df_query['query']), ['page', 'query', 'clicks', 'impressions']]
+            .sort_values(['page', 'query'], ignore_index=True)
             #we calculate the click percentage 
             .assign(
-                click_pct = lambda df_: df_.groupby('query')['clicks'].transform(lambda x: x / x.sum())
+                click_pct = lambda df_: df_['clicks'] / df_.groupby('query')['clicks'].transform('sum')
             )  
         )
         
         #queries to keep 
+        #(at least two pages with 10% of the clicks)
         queries_to_keep = (
             final 
-            .query('click_pct >= 0.1')
-            .groupby('query')
-            .filter(lambda x: len(x) >= 2)
-            ['query']
+            .loc[lambda df_: df_['click_pct'] >= 0.1]
+            .loc[lambda df_: df_.groupby('query')['query'].transform('size') >= 2, 'query']
             .unique()
         )
 
         #we keep only these queries 
         final = (
             final 
-            .query('query in @queries_to_keep')
+            .loc[lambda df_: df_['query'].isin(queries_to_keep)]
             .merge(
                 df_page, 
                 on='page', 
@@ -512,104 +692,74 @@ class Report:
             )
             .rename(columns={'clicks_x': 'clicks_query', 'clicks_y': 'clicks_page'})
             .assign(
-                click_pct_page = lambda df_:df_.clicks_query / df_.clicks_page, 
-                opportunity_level = lambda df_:(
-                    np
-                    .where(
-                        (df_.click_pct_page >=0.1) & (df_.click_pct >= 0.1), 
-                        "Potential Opportunity", 
-                        "Risk - Low percentage of either query-level or page-level clicks"
-
-                    )
-                )
+                click_pct_page = lambda df_:df_.clicks_query / df_.clicks_page
             )
-            .query('opportunity_level == "Potential Opportunity"')
-            .drop('opportunity_level', axis=1)
+            #we keep only the potential opportunities 
+            #(at least 10% of the clicks of the query and of the page)
+            .loc[lambda df_: (df_.click_pct_page >= 0.1) & (df_.click_pct >= 0.1)]
+            #on queries with at least two of them 
+            .loc[lambda df_: df_.duplicated('query', keep=False)]
             .assign(
-                keep = lambda df_:df_.duplicated('query', keep=False), 
                 click_pct = lambda df_: round(df_.click_pct*100, 2), 
                 click_pct_page = lambda df_: round(df_.click_pct_page*100, 2) 
             )
-            .query('keep == True')
-            .drop('keep', axis=1)
             .sort_values(['query','clicks_query'], ascending=[True, False])
         )
 
         return final 
 
+    @requires(dimensions=['date'], metrics=['clicks'])
     def forecast(self, days):
-        from prophet import Prophet
+        #we need a number of days to forecast before fitting anything 
+        if not isinstance(days, int) or days <= 0:
+            raise ValueError('Days must be a positive integer.')
         
-        #ensure that we have date as a dimension 
-        if 'date' not in self.dimensions:
-            raise ValueError('Your report needs a date dimension to call this method.')
-        
-        #ensure that we have clicks as a metric
-        if 'clicks' not in self.metrics:
-            raise ValueError('Your report needs clicks as a metric to call this method.')
-
         df = (
             self 
-            .df
-            .groupby('date', as_index=False)
-            .agg({'clicks': 'sum'})
+            ._clicks_per_day
             .rename(
                 columns = {'date': 'ds', 'clicks': 'y'}
             )
         )
 
-        m = Prophet()
-        m.fit(df)
-        future = m.make_future_dataframe(periods=days)
-        forecast = m.predict(future)
-        return forecast 
+        #Prophet is only used when we have enough data to justify its cost
+        return utils.forecast_series(df, days)
 
     #brand vs non brand traffic evolution 
+    @requires(dimensions=['query', 'date'])
     def brand_vs_no_brand(self, brand_variants):
-        
-        #check that query is in the dimensions 
-        if 'query' not in self.dimensions:
-            raise ValueError('Your report needs a query dimension to call this method.')
-        
-        #we need the date dimension
-        if 'date' not in self.dimensions:
-            raise ValueError('Your report needs a date dimension to call this method.')
-        
-        
-        brand = (
-            self
-            .df 
-            .query('query.str.contains("|".join(@brand_variants))')
-            .groupby('date', as_index=False)
-            #dict comprension to create the metrics we want
-            .agg({metric: 'sum' for metric in self.metrics})
-            .filter(['date','clicks','impressions'])
-        )
+        is_brand = self._is_brand(brand_variants)
 
-        no_brand = (
-            self 
-            .df 
-            .query('query.str.contains("|".join(@brand_variants))==False')
-            #drop columns that are not clicks or impressions 
-            .groupby('date', as_index=False)
-            #dict comprension to create the metrics we want
-            .agg({metric: 'sum' for metric in self.metrics})
-            .filter(['date','clicks','impressions'])
-        )
+        metrics = [metric for metric in ['clicks','impressions'] if metric in self.metrics]
 
-        return (
-            brand
-            .merge(
-                no_brand,
-                on = 'date',
-                how = 'outer',
-                suffixes = ('_brand', '_no_brand')
+        #brand and no brand data are aggregated in the same pass
+        #with a bincount on the cached date codes (two slots per date) instead of grouping on a string key
+        date_codes, dates = self._date_codes
+        keys = date_codes * 2 + is_brand
+        totals = {
+            metric: (
+                np.bincount(keys, weights=self.df[metric].to_numpy(), minlength=2 * len(dates))
+                .astype(self.df[metric].dtype)
+                .reshape(-1, 2)
             )
-            .fillna(0)
+            for metric in metrics
+        }
+
+        #we always have both columns (clicks_brand, clicks_no_brand, ...), even if one of the sides is empty
+        return pd.DataFrame(
+            {
+                'date': dates,
+                **{
+                    metric + suffix: totals[metric][:, side] 
+                    for suffix, side in [('_brand', 1), ('_no_brand', 0)] 
+                    for metric in metrics
+                }
+            }
         )
 
 
     #keyword gap
+    @requires(dimensions=['query'])
     def keyword_gap(self, df=None, keyword_column=None):
         
         # Check if df is a pandas DataFrame
@@ -619,49 +769,35 @@ class Report:
         # Check if the specified column is in the DataFrame
         if keyword_column not in df.columns:
             raise ValueError(f"{keyword_column} is not a column in the DataFrame")
-        
-        #ensure that we have the query dimension
-        if 'query' not in self.dimensions:
-            raise ValueError('Your report needs a query dimension to call this method.')
 
-        return (
-            df[df[keyword_column].isin(self.df['query'])==False]
-        )
+        #the unique queries come from the cached factorization of the report 
+        #(computed once per dataframe and shared with the other methods)
+        _, queries = self._query_codes
+        return df[~df[keyword_column].isin(queries)]
         
     #causal impact 
+    @requires(dimensions=['date'], metrics=['clicks'])
     def causal_impact(self, intervention_date = None ):
         
         #we neeed some extra libraries for this method 
         from causalimpact import CausalImpact
-        import datetime
         
         #interverntion date must be defined
         if not intervention_date:
             raise ValueError("Intervention_date must be defined")
-        
-        #date must be a dimensions 
-        if 'date' not in self.dimensions:
-            raise ValueError('Your report needs a date dimension to call this method.')
-        
-        #clicks must be a metric
-        if 'clicks' not in self.metrics:
-            raise ValueError('Your report needs clicks as a metric to call this method.')
-
 
-        data = (
-            self
-            .df 
-            .filter(items=['date', 'clicks'])
-            .groupby('date', as_index=False)
-            .agg({'clicks': 'sum'})
-        )
+        data = self._clicks_per_day
         
+        #the date arithmetic is done on datetime64 values (day precision)
+        one_day = np.timedelta64(1, 'D')
+        intervention = np.datetime64(intervention_date, 'D')
+        last_date = data['date'].max().to_datetime64().astype('datetime64[D]')
         #calculate the number of days between the last data point and the intervention date 
-        days = (pd.to_datetime(data['date']).max() - pd.to_datetime(intervention_date)).days
+        days = (last_date - intervention) // one_day
         #get the prior dates 
-        max_date = pd.to_datetime(data['date']).max().strftime("%Y-%m-%d")
-        max_before_interenvention = utils.get_date_days_before(intervention_date, days=1)
-        min_before_intervention = utils.get_date_days_before(max_before_interenvention, days=days)
+        max_date = np.datetime_as_string(last_date)
+        max_before_interenvention = np.datetime_as_string(intervention - one_day)
+        min_before_intervention = np.datetime_as_string(intervention - (days + 1)*one_day)
 
         #get the interval for the analysis  
         post_period = [intervention_date, max_date]
@@ -675,6 +811,7 @@ class Report:
         return ci 
     
     #function to update the urls in the report using a redirect mapping 
+    @requires(dimensions=['page'])
     def update_urls(self, redirect_mapping):
         
         #redirect mapping needs to be a pandas DataFrame
@@ -685,55 +822,61 @@ class Report:
         if not all(elem in redirect_mapping.columns for elem in ['from','to']):
             raise ValueError('redirect_mapping must have a from and a to column')
         
-        #we need to have a page dimension
-        if 'page' not in self.dimensions:
-            raise ValueError('Your report needs a page dimension to call this method.')
+        #a page can only be redirected to one URL
+        if redirect_mapping['from'].duplicated().any():
+            raise ValueError('redirect_mapping must not have duplicated values in the from column')
+        
+        #both sides of the merge share the same categories 
+        #so the join is done on integer codes instead of hashing the URLs
+        #(the unique pages of the cached factorization, without the missing ones)
+        pages = pd.CategoricalDtype(self._page_codes[1])
         
-        self_copy = deepcopy(self)
+        #a shallow copy is enough: the merge below creates a new dataframe 
+        #and self.df is never modified
+        self_copy = self._copy()
         #we update the variables in the object itself 
         self_copy.df = (
             #we marge our initial response from the GSC API 
-            self_copy
+            self
             .df
+            .astype({'page': pages})
             .merge(
                 #with our redirect mapping 
                 redirect_mapping
                 #keep only useful columns 
-                .filter(items=['from','to']),
+                .loc[:, ['from','to']]
+                .astype({'from': pages})
+                #URLs which are not in our report can't be matched
+                .dropna(subset=['from']),
                 #the dimension name from GSC API 
                 left_on = 'page',
                 #the column name in the redirect mapping
                 right_on = 'from',
-                how = 'left'
+                how = 'left',
+                validate = 'many_to_one'
             )
             .assign(
                 #we change the page value based on the redirect mapping
                 #if we have a na value, it's becase the page is not in our redirect mapping 
                 page = lambda df_:df_['to'].fillna(df_['page'])
             )
+            #the columns from the redirect mapping are not needed anymore 
+            .drop(columns=['from','to'])
         )
         
         return self_copy
     
     #extract search volume from dataforSEO 
+    @requires(dimensions=['query'])
     def extract_search_volume(self, location_code, client_email, client_password, calculate_cost = True):
         #check that the location code is an integer
         if not isinstance(location_code, int):
             raise ValueError('Location code must be an integer.')
         
-        #check that we have a query dimension
-        if 'query' not in self.dimensions:
-            raise ValueError('Your report needs a query dimension to call this method.')
-        
         #donwload the valid options for the location code
+        #(only once per session for the same credentials)
         client = utils.RestClient(client_email, client_password)
-        r = client.get('/v3/keywords_data/google_ads/locations')
-        #if we can't download the data, we stop the process
-        if r['status_code'] != 20000:
-            raise ValueError('We could not download the location data. Please check your credentials.')
-        #we convert the data into a dataframe
-        location_codes = pd.DataFrame(r['tasks'][0]['result']).location_code.tolist()
-        if location_code not in location_codes:
+        if location_code not in utils.get_location_codes(client_email, client_password):
             raise ValueError('Location code not valid. Check https://docs.dataforseo.com/v3/keywords_data/google_ads/locations/ for the accepted values.')
         
         #we create the list of keywords we want to extract
@@ -755,7 +898,7 @@ class Report:
                 .df 
                 .merge(
                     sv
-                    .query('monthly_searches.isna()==False')
+                    .loc[lambda df_: df_['monthly_searches'].notna()]
                     .drop_duplicates(subset = ['keyword'], keep='first')
                     .filter(items = ['keyword', 'search_volume']),
                     left_on = 'query',
@@ -769,61 +912,100 @@ class Report:
             )
             
     #fonctions to find potential contents to kill 
+    @requires(dimensions=['page'], metrics=['clicks', 'impressions'])
     def find_potential_contents_to_kill(self, sitemap_url=None, clicks_threshold = 0, impressions_threshold = 0):
-        #we need the page dimension
-        if 'page' not in self.dimensions:
-            raise ValueError('Your report needs a page dimension to call this method.')
-        
-        #we need the impressions & the clicks 
-        if not all(elem in self.metrics for elem in ['clicks','impressions']):
-            raise ValueError('Your report needs clicks and impressions metrics to call this method.')
-        
         #check that we have a sitemap 
         if not sitemap_url:
             raise ValueError('Please provide a sitemap_url.')
         
-        #download the urle from the sitemap
-        urls = pd.DataFrame(utils.get_urls_from_sitemap(sitemap_url), columns=['loc'])
+        #thresholds must be positive numbers 
+        if not all(isinstance(elem, (int, float)) and elem >= 0 for elem in [clicks_threshold, impressions_threshold]):
+            raise ValueError('Thresholds must be positive numbers.')
+        
+        #all the checks that don't need a network call are done before downloading the sitemap
+        utils.check_sitemap_url(sitemap_url)
+        
+        #we aggregate our data before the download so any issue with the report is raised first
+        #(summed on the cached page codes, the pages are sorted as with a groupby)
+        codes, pages = self._page_codes
+        has_page = codes >= 0
+        pages_data = pd.DataFrame(
+            {
+                'page': pages,
+                **{
+                    metric: (
+                        np.bincount(codes[has_page], weights=self.df[metric].to_numpy()[has_page], minlength=len(pages))
+                        .astype(self.df[metric].dtype)
+                    )
+                    for metric in ['clicks', 'impressions']
+                }
+            }
+        )
+        #the threshold is applied before the merge 
+        #pages above it can't be returned, whatever the sitemap contains
+        is_below = (
+            (pages_data['clicks'] <= clicks_threshold) 
+            & (pages_data['impressions'] <= impressions_threshold)
+        )
+        pages_above = set(pages_data.loc[~is_below, 'page'])
+        pages_data = pages_data[is_below]
+        
+        #download the urle from the sitemap (a URL can be listed in several sitemaps, we keep it once)
+        #and remove the URLs we already know are above our thresholds
+        urls = pd.DataFrame(
+            [url for url in dict.fromkeys(self._get_sitemap_urls(sitemap_url)) if url not in pages_above],
+            columns=['loc']
+        )
+        #sitemap URLs and pages share the same categories 
+        #so the join is done on integer codes instead of hashing the URLs
+        pages = pd.CategoricalDtype(pd.unique(pd.concat([urls['loc'], pages_data['page']])))
         
         #return the pages that are in the sitemap but below our thresholds
+        #URLs which are not in our report have no clicks and no impressions
         return (
             urls
+            .astype({'loc': pages})
             .merge(
-                self.df.groupby('page', as_index=False).agg({'clicks': 'sum', 'impressions': 'sum'}),
+                pages_data
+                .astype({'page': pages}),
                 left_on = 'loc',
                 right_on = 'page',
-                how = 'left'
+                how = 'left',
+                validate = 'many_to_one'
             )
-            .fillna(0)
-            .query('clicks <= @clicks_threshold & impressions <= @impressions_threshold')
             .drop('page', axis=1)
+            .fillna({'clicks': 0, 'impressions': 0})
         )
         
     #change of position ovr time 
+    @requires(dimensions=['query', 'date'])
     def position_over_time(self):
-        #ensure that we have the date and query dimension 
-        if not all(elem in self.dimensions for elem in ['query','date']):
-            raise ValueError('Your report needs a query and a date dimension to call this method.')
-        
-        return (
-            self
-            .df
-            .assign(
-                #we round position to have a better view of the evolution
-                position = lambda df_: round(df_['position']), 
-                #we need to have a time object here 
-                #we then keep only the yearMonth
-                date = lambda df_: pd.to_datetime(df_['date']).dt.strftime("%Y-%m")
-            )
-            #we just want the top 10 here 
-            .query('position <= 10')
-            #we create a pivot with position as the x-axis and the yearMonth as the y-axis
-            .pivot_table(
-                index = 'position', 
-                columns = 'date', 
-                values = 'query', 
-                aggfunc = 'count'
-            )
+        #we round position to have a better view of the evolution
+        #and we just want the top 10 here 
+        #(only the rows with a query are counted)
+        position = np.round(self.df['position'].to_numpy())
+        keep = (position <= 10) & (self._query_codes[0] >= 0)
+        positions, position_codes = np.unique(position[keep], return_inverse=True)
+        #the yearMonth is formatted once per unique date and mapped back with the cached date codes
+        date_codes, dates = self._date_codes
+        month_codes, months = pd.factorize(dates.strftime('%Y-%m'), sort=True)
+        month_codes = month_codes[date_codes[keep]]
+        
+        #the number of rows by position and yearMonth is counted in a single bincount
+        #(the months without any row in the top 10 are not returned)
+        counts = (
+            np.bincount(position_codes * len(months) + month_codes, minlength=len(positions) * len(months))
+            .reshape(len(positions), len(months))
+        )
+        observed_months = np.unique(month_codes)
+        counts = counts[:, observed_months]
+        
+        #we create a pivot with position as the x-axis and the yearMonth as the y-axis
+        #(nan when there is no row for a position and a yearMonth)
+        return pd.DataFrame(
+            counts if counts.all() else np.where(counts > 0, counts, np.nan),
+            index = pd.Index(positions.astype('int8'), name='position'),
+            columns = pd.CategoricalIndex(months.take(observed_months), categories=months, name='date')
         )
     
     
@@ -865,111 +1047,111 @@ class Report:
             raise ValueError('Type must be either page or query')
         
         #cut the df to have complete months only
-        #we start by converting the date to a datetime object
-        df = (
-            self
-            .df
-            .assign(
-                date = lambda df_: pd.to_datetime(df_['date'])
-            )
-        )
+        df = self.df
         #Find the start and end of the full months
-        start_date = df['date'].min()
+        #the boundaries are computed with datetime64 arithmetic (day precision)
+        one_day = np.timedelta64(1, 'D')
+        start_date = df['date'].min().to_datetime64().astype('datetime64[D]')
+        end_date = df['date'].max().to_datetime64().astype('datetime64[D]')
         if period == 'month': 
             #used later in the final data manipulation 
             date_format = '%Y-%m'
             #if this is not the first day of the month, we want the first day of the following month 
-            if start_date.day != 1:
-                start_date = (start_date + pd.offsets.MonthBegin(1))
+            start_month = start_date.astype('datetime64[M]')
+            if start_date != start_month.astype('datetime64[D]'):
+                start_date = (start_month + 1).astype('datetime64[D]')
         
-            #do the same for the end date
-            end_date = df['date'].max()
-            if end_date.is_month_end == False:
-                end_date = (end_date - pd.offsets.MonthEnd(1))
+            #do the same for the end date: if this is not the last day of the month
+            #we want the last day of the previous month
+            end_month = end_date.astype('datetime64[M]')
+            if end_date != (end_month + 1).astype('datetime64[D]') - one_day:
+                end_date = end_month.astype('datetime64[D]') - one_day
         
         elif period == 'week':
             #used later in the final data manipulation 
+            #weeks are not trimmed, the first and the last ones can be incomplete
             date_format = '%Y-%U'
-            #if this is not the first day of the week, we want the first day of the following week 
-            if start_date.dayofweek != 0:
-                start_date = (start_date + pd.offsets.Week(0))
-            
-            #do the same for the end date
-            end_date = df['date'].max()
-            if end_date.dayofweek != 6:
-                #get prevous monday
-                end_date = (end_date + pd.offsets.Week(0))
+        
+        start_date, end_date = pd.Timestamp(start_date), pd.Timestamp(end_date)
+
+        #we aggregate the metric by page (or query) and period on the cached codes
+        #so the strings are not hashed again by a groupby and a second factorize
+        codes, groups = self._page_codes if type == 'page' else self._query_codes
+        #the cached dates are sorted, so the full periods are a contiguous slice of them
+        #and the period label (yearMonth or yearWeek) is only formatted once per date
+        date_codes, dates = self._date_codes
+        first, last = dates.searchsorted(start_date), dates.searchsorted(end_date, side='right')
+        in_range = (date_codes >= first) & (date_codes < last) & (codes >= 0)
+        period_of_date, periods = pd.factorize(dates[first:last].strftime(date_format), sort=True)
+        keys, key_ids = np.unique(
+            codes[in_range] * len(periods) + period_of_date[date_codes[in_range] - first], 
+            return_inverse=True
+        )
+        values = (
+            np.bincount(key_ids, weights=df[metric].to_numpy()[in_range])
+            .astype(df[metric].dtype)
+        )
+
+        #for each page, we get its peak value, the period of this peak 
+        #and its value during the last period in a single pass
+        #only the pages with data during the last period can be returned
+        #so the others are removed before the sort done by decay_stats
+        last_period_id = periods.get_indexer([end_date.strftime(date_format)])[0]
+        group_ids, period_ids = keys // len(periods), keys % len(periods)
+        has_last_period = np.zeros(len(groups), dtype=bool)
+        has_last_period[group_ids[period_ids == last_period_id]] = True
+        keep = has_last_period[group_ids]
+        metric_max, period_max, metric_last_period = utils.decay_stats(
+            group_ids[keep], 
+            period_ids[keep], 
+            values[keep], 
+            last_period_id, 
+            len(groups)
+        )
 
         df = (
-            df
-            #filter based on start & end date 
-            .query('@start_date <= date <= @end_date')
-            #.query('date >= @start_date & date <= @end_date')
-            #create a yearMonth column
-            .assign(
-                date_period = lambda df_: df_['date'].dt.strftime(date_format)
-            )
-            #group by page and date 
-            .groupby([type,'date_period'], as_index=False)
-            .agg({metric: 'sum'})
-            .assign(
-                #get the max number of clicks per page 
-                metric_max = lambda df_: df_.groupby(type)[metric].transform('max'), 
-                #get the date of the max period 
-                period_max = lambda df_:(
-                    df_
-                    .groupby([type,'date_period'], as_index=False)
-                    .agg({metric:'sum'})
-                    .sort_values(metric, ascending=False)['date_period']
-                    .iloc[0]
-                )
+            pd
+            .DataFrame(
+                {
+                    type: groups, 
+                    'metric_last_period': metric_last_period, 
+                    'metric_max': metric_max, 
+                    'period_max': periods[period_max]
+                }
             )
+            #keep only the pages with data during the last period
+            .dropna(subset=['metric_last_period'])
+            .astype({'metric_last_period': values.dtype})
             #remove pages with less than X clicks based on the threshold
-            .query('metric_max >= @threshold_metric')
-            #reame column to better reflect what we have
-            .rename(columns = {metric: 'metric_last_period'})
-            #keep only the last month
-            .query('date_period == @end_date.strftime(@date_format)')
+            .loc[lambda df_: df_['metric_max'] >= threshold_metric]
             .assign(
                 decay = lambda df_: round(1 - df_['metric_last_period'] / df_['metric_max'],3), 
                 decay_abs = lambda df_: df_['metric_max'] - df_['metric_last_period']
             )
-            .drop('date_period', axis = 1)
-            .query('decay >= @threshold_decay')
+            .loc[lambda df_: df_['decay'] >= threshold_decay]
             .sort_values('decay_abs', ascending=False)
         )
         
         return df 
     
     #function to check if we have pages in GSC that are not in our sitemap
+    @requires(dimensions=['page'])
     def pages_not_in_sitemap(self, sitemap_url):
-        #we need the page dimension
-        if 'page' not in self.dimensions:
-            raise ValueError('Your report needs a page dimension to call this method.')
-        
         #check that we have a correct sitemap URL 
         if utils.check_sitemap_url(sitemap_url):
             #download the urle from the sitemap
-            urls = pd.DataFrame(utils.get_urls_from_sitemap(sitemap_url), columns=['loc'])
+            #the URLs are only used for a membership test, no need for a dataframe
+            urls = frozenset(self._get_sitemap_urls(sitemap_url))
+            #the test is done on the unique pages and mapped back to the rows with their codes
+            codes, pages = self._page_codes
             
-            return (
-                self
-                .df
-                .query('page.isin(@urls["loc"])==False')
-            )
+            return self.df[~take_by_codes(pages.isin(urls), codes, False)]
     
     #function to find winners and losers between two period 
+    @requires(dimensions=['page', 'date'], metrics=['clicks'])
     def winners_losers(self, period_from, period_to):
         from datetime import datetime
         
-        #we need to have the page and the date dimensions 
-        if not all(elem in self.dimensions for elem in ['page','date']):
-            raise ValueError('Your report needs a page and a date dimension to call this method.')
-        
-        #check that we have the metric in our metrics 
-        if 'clicks' not in self.metrics:
-            raise ValueError('Your report needs clicks to call this method.')
-        
         #period from and period to must be a list of two elements
         if not isinstance(period_from, list) or len(period_from) != 2:
             raise ValueError('Period from must be a list of two elements.')
@@ -994,36 +1176,46 @@ class Report:
             raise ValueError('Periods must not overlap.')
         
         #check that the data we provide in df is within the two periods 
-        if pd.to_datetime(self.df['date']).min() > datetime.strptime(period_from[0], "%Y-%m-%d"):
+        #(the first and last dates are read from the sorted dates of the cached date codes)
+        date_codes, dates = self._date_codes
+        if dates[0] > datetime.strptime(period_from[0], "%Y-%m-%d"):
             raise ValueError('The data in your report is not within the period from.')
-        if pd.to_datetime(self.df['date']).max() < datetime.strptime(period_to[1], "%Y-%m-%d"):
+        if dates[-1] < datetime.strptime(period_to[1], "%Y-%m-%d"):
             raise ValueError('The data in your report is not within the period to.')
         
-        #we create two dataframes with the data for each period
-        df_from = (
-            self
-            .df
-            .query('@period_from[0] <= date <= @period_from[1]')
-            .groupby(['page'], as_index=False)
-            .agg({'clicks': 'sum'})
-        )
-        
-        df_to = (
-            self
-            .df
-            .query('@period_to[0] <= date <= @period_to[1]')
-            .groupby(['page'], as_index=False)
-            .agg({'clicks': 'sum'})
-        )
+        #both periods are aggregated in a single pass on the page codes 
+        #instead of two groupbys + a merge
+        #the bounds are converted once so the comparisons are done on datetime64 values
+        #the periods of each date are found on the unique dates of the cached date codes
+        #(1 for the period from, 2 for the period to, 3 for a date shared by both periods)
+        period_from = [pd.Timestamp(date) for date in period_from]
+        period_to = [pd.Timestamp(date) for date in period_to]
+        period = (
+            ((dates >= period_from[0]) & (dates <= period_from[1])).astype(np.int64)
+            + 2 * ((dates >= period_to[0]) & (dates <= period_to[1]))
+        )[date_codes]
+        
+        #clicks and rows are counted by page and period in one pass over the rows
+        codes, pages = self._page_codes
+        clicks = self.df['clicks'].to_numpy()
+        has_page = codes >= 0
+        keys = codes[has_page] * 4 + period[has_page]
+        clicks_by_period = np.bincount(keys, weights=clicks[has_page], minlength=4 * len(pages)).reshape(-1, 4)
+        rows_by_period = np.bincount(keys, minlength=4 * len(pages)).reshape(-1, 4)
+        clicks_before = clicks_by_period[:, 1] + clicks_by_period[:, 3]
+        clicks_after = clicks_by_period[:, 2] + clicks_by_period[:, 3]
+        #we only keep the pages with data in at least one of the periods
+        #a page without data for a period has 0 clicks for this period
+        keep = rows_by_period[:, 1:].sum(axis=1) > 0
         
         return (
-        #we marge the two dataframes on the page key 
-            df_from
-            .merge(
-                df_to,
-                on = 'page',
-                how = 'outer',
-                suffixes = ('_before','_after')
+            pd
+            .DataFrame(
+                {
+                    'page': pages[keep],
+                    'clicks_before': clicks_before[keep].astype(clicks.dtype),
+                    'clicks_after': clicks_after[keep].astype(clicks.dtype),
+                }
             )
             #we assign a value based on either it is a winner or a loser 
             .assign(
@@ -1045,67 +1237,56 @@ class Report:
         if 'query' not in self.dimensions: 
             raise ValueError('The query dimension is not included in your report.')
         
+        #count the number of words per query 
+        #counting the spaces avoids building a list of words for each query
+        #and it is done once per unique query, mapped back with the cached query codes
+        codes, queries = self._query_codes
+        n_words = (pd.Series(queries, dtype=object).str.count(' ') + 1).to_numpy()
+        
         return (
             self 
             .df 
-            .assign(
-                #count the number of words per query 
-                n_words = lambda df_:df_['query'].str.split(' ').str.len()
-            )
+            .assign(n_words = take_by_codes(n_words, codes))
             #we filter based on our condition 
-            .query('n_words >= @number_of_words')
+            .loc[lambda df_: df_['n_words'] >= number_of_words]
         )
     
     #find outliers based on CTR 
     def find_ctr_outliers(self):
-        import numpy as np 
         #first we need to get our ctr curve for our data 
-        ctr_yield_curve = self.ctr_yield_curve().filter(items=['position','ctr'])
+        ctr_yield_curve = self.ctr_yield_curve()[['ctr']]
         #no need to perform all checks here because it would be handled by the
         #ctr_yield_curve() method called just before 
         
-        #first we get the weighted average position for the query
-        weighted_avg_position = (
-            self 
-            .df 
-            .groupby('query')
-            .apply(lambda x: round(np.average(x['position'], weights=x['impressions'])))
-            .reset_index(name='position')
-            #keep only useful columns 
-            .filter(items=['query','position'])
-            #do not keep query below 10 
-            .query('position <= 10')
+        #we aggregate clicks, impressions and the weighted average position by query
+        #with bincount calls on the query codes instead of a groupby and two merges
+        codes, queries = self._query_codes
+        has_query = codes >= 0
+        codes = codes[has_query]
+        impressions = self.df['impressions'].to_numpy()[has_query]
+        clicks_by_query = np.bincount(codes, weights=self.df['clicks'].to_numpy()[has_query], minlength=len(queries))
+        impressions_by_query = np.bincount(codes, weights=impressions, minlength=len(queries))
+        position = np.round(
+            np.bincount(codes, weights=self.df['position'].to_numpy()[has_query]*impressions, minlength=len(queries))
+            / impressions_by_query
         )
+        #do not keep query below 10 
+        keep = position <= 10
         
         df = (
-            self
-            .df 
-            .groupby('query', as_index=False)
-            .agg(
+            pd
+            .DataFrame(
                 {
-                    'clicks':'sum',
-                    'impressions':'sum', 
+                    'query': queries[keep],
+                    'clicks': clicks_by_query[keep].astype(self.df['clicks'].dtype),
+                    'impressions': impressions_by_query[keep].astype(self.df['impressions'].dtype),
+                    #we calcule the CTR by query 
+                    'real_ctr': np.round(100*clicks_by_query[keep]/impressions_by_query[keep], 2),
+                    'position': position[keep],
+                    #the expected ctr is read from the curve, indexed by position
+                    'expected_ctr': ctr_yield_curve['ctr'].reindex(position[keep]).to_numpy(),
                 }
             )
-            .assign(
-                #we calcule the CTR by query 
-                real_ctr=lambda df_:round(100*df_.clicks/df_.impressions, 2)
-            )
-            #add the position 
-            .merge(
-                weighted_avg_position, 
-                on='query',
-                #right to remove the query with a weighted position > 10  
-                how='right'
-            )
-            #add the expected ctr 
-            .merge(
-                ctr_yield_curve, 
-                on='position', 
-                how='left'
-            )
-            #rename column to have a better name in this context 
-            .rename({'ctr':'expected_ctr'}, axis=1)
             #calculate the diff between expected and real clicks 
             .assign(
                 loss = lambda df_:round(df_.impressions*(df_.expected_ctr - df_.real_ctr)/100)
@@ -1113,7 +1294,7 @@ class Report:
             #we order by loss 
             .sort_values(by='loss', ascending=False)
             #we keep only rows where we underperform 
-            .query('loss > 0')
+            .loc[lambda df_: df_['loss'] > 0]
         )
         
         return df 
@@ -1127,130 +1308,143 @@ class Report:
         if metric not in self.metrics:
             raise ValueError('Your report needs the metric you want to use to call this method.')
         
-        return (
+        #the order is computed by sorting the metric column only (same order as sorting the whole dataframe)
+        #and the rows are gathered once at the end
+        order = (
             self
-            .df 
-            .sort_values(metric, ascending=False)
-            .assign(
-                metric_cumsum = lambda df_:round(100*df_[metric].cumsum()/df_[metric].sum(), 2),
-                abcd = lambda df_:(
-                    df_
-                    ['metric_cumsum']
-                    .case_when(
-                        caselist = [
-                            (df_['metric_cumsum'].between(0, 50, inclusive='left'), 'A'),
-                            (df_['metric_cumsum'].between(50, 75, inclusive='left'), 'B'),
-                            (df_['metric_cumsum'].between(75, 90, inclusive='left'), 'C'),
-                            (df_['metric_cumsum'].between(90, 100, inclusive='both'), 'D'),
-                        ]
-                    )
-                )
-            )
-            .drop('metric_cumsum', axis=1)
+            .df[metric]
+            .reset_index(drop=True)
+            .sort_values(ascending=False)
+            .index
+            .to_numpy()
         )
+        #cumulative percentage contribution of each row
+        values = self.df[metric].to_numpy()[order]
+        metric_cumsum = np.round(100*values.cumsum()/values.sum(), 2)
+        #a single searchsorted call gives the class of each row: 
+        #A below 50%, B below 75%, C below 90% and D for the rest
+        abcd = np.array(['A','B','C','D'], dtype=object)[
+            np.searchsorted([50, 75, 90], metric_cumsum, side='right')
+        ]
+        #no class can be assigned if the metric sums to 0
+        abcd[np.isnan(metric_cumsum)] = np.nan
+        
+        #the rows gathered by take are already a new dataframe
+        #so the class is added in place instead of copying it again with assign
+        df = self.df.take(order)
+        df['abcd'] = abcd
+        
+        return df
     
+    @requires(dimensions=['date', 'page'])
     def pages_per_day(self):
-        #check that we have the date and page dimensions
-        if not all(elem in self.dimensions for elem in ['date','page']):
-            raise ValueError('Your report needs a date and a page dimension to call this method.')
-        
-        return (
-            self
-            .df
-            .assign(
-                date = lambda df_: pd.to_datetime(df_['date']).dt.strftime('%Y-%m-%d')
-            )
-            .sort_values('date', ascending=True)
-            .groupby('date')
-            .agg({'page': 'nunique'})
+        #we count the unique (date, page) pairs on integer codes 
+        #so the dates are sorted and formatted once per day instead of once per row
+        page_codes, pages = self._page_codes
+        date_codes, dates = self._date_codes
+        has_page = page_codes >= 0
+        #(deduplicated with a hash table, the pairs don't need to be sorted for bincount)
+        pairs = pd.unique(date_codes[has_page] * len(pages) + page_codes[has_page])
+        
+        return pd.DataFrame(
+            {'page': np.bincount(pairs // len(pages), minlength=len(dates))},
+            index = pd.Index(dates.strftime('%Y-%m-%d'), name='date')
         )
         
+    @requires(dimensions=['date', 'page'])
     def pages_lifespan(self):
-        #check that we have the date and page dimensions
-        if not all(elem in self.dimensions for elem in ['date','page']):
-            raise ValueError('Your report needs a date and a page dimension to call this method.')
+        #we get the number of unique dates by page from the unique (page, date) pairs
+        page_codes, pages = self._page_codes
+        date_codes, dates = self._date_codes
+        has_page = page_codes >= 0
+        #(deduplicated with a hash table, the pairs don't need to be sorted for bincount)
+        pairs = pd.unique(page_codes[has_page] * len(dates) + date_codes[has_page])
+        days_per_page = np.bincount(pairs // len(dates), minlength=len(pages))
+        #summarize 
+        #(built in order of appearance and sorted by count, like value_counts)
+        durations, first_page, count = np.unique(days_per_page, return_index=True, return_counts=True)
+        order = np.argsort(first_page)
         
         return (
-            self
-            .df 
-            #group by page
-            .groupby('page', as_index=False)
-            #get the number of unique dates by page 
-            .agg({'date':'nunique'})
-            .date
-            #summarize 
-            .value_counts()
-            .reset_index()
-            .rename(columns={'date':'duration (days)'})
+            pd
+            .DataFrame(
+                {
+                    'duration (days)': durations[order], 
+                    'count': count[order]
+                }
+            )
+            .sort_values('count', ascending=False, ignore_index=True)
         )
     
+    @requires(dimensions=['date'])
     def seasonality_per_day(self):
-        #check that we have the date dimension
-        if 'date' not in self.dimensions:
-            raise ValueError('Your report needs a date dimension to call this method.')
-        
-        return (
-            self.df
-            .assign(
-                #get the day of the week 
-                date=lambda df_: pd.to_datetime(df_['date']).dt.day_name()
-            )
-            .assign(
-                #reorder from Monday to Sunday 
-                date=lambda df_: pd.Categorical(df_['date'], categories=[
-                    'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
-                    ordered=True)
+        #we sum the metrics by day of the week (0 is Monday) 
+        #on the integer weekday instead of grouping on day names
+        #(computed on the unique dates and mapped back with the cached date codes)
+        date_codes, dates = self._date_codes
+        weekday = dates.dayofweek.to_numpy()[date_codes]
+        
+        return pd.DataFrame(
+            {
+                metric: np.bincount(weekday, weights=self.df[metric].to_numpy(), minlength=7).astype(self.df[metric].dtype)
+                for metric in ['clicks', 'impressions']
+            },
+            #ordered from Monday to Sunday 
+            #(the categories are explicit, otherwise they would be sorted alphabetically)
+            index = pd.CategoricalIndex(
+                WEEKDAYS,
+                categories=WEEKDAYS,
+                ordered=True,
+                name='date'
             )
-            #group by day of the week
-            .sort_values('date', ascending=True)
-            .groupby('date')
-            .agg({'clicks': 'sum', 'impressions': 'sum'})
         )
     
+    @requires(dimensions=['query'])
     def replace_query_from_list(self, list_to_replace):
-        from functools import reduce
-        #Function to apply replacements
-        def replace_element(column, element):
-            return column.str.replace(element, "_element_")
+        #nothing to replace 
+        if not list_to_replace:
+            return self.df.assign(query_replaced = self.df['query'])
         
-        #we need to have the query dimension
-        if 'query' not in self.dimensions:
-            raise ValueError('Your report needs a query dimension to call this method.')
+        #the elements are matched literally, in a single pass over the query column
+        #(when several elements match at the same position, the first one of the list wins)
+        #the replacement is done once per unique query and mapped back with the cached query codes
+        pattern = re.compile('|'.join(map(re.escape, list_to_replace)))
+        codes, queries = self._query_codes
+        queries_replaced = pd.Series(queries, dtype=object).str.replace(pattern, '_element_', regex=True)
         
         return (
             self 
             .df 
             .assign(
-                #freduce funtion to apply the replace_element function to the query column
-                query_replaced = reduce(replace_element, list_to_replace, self.df['query'])
+                query_replaced = take_by_codes(queries_replaced, codes)
             )
         )
     
     #inspired by https://www.searchenginejournal.com/big-query-and-gsc-data-content-performance-analysis/508481/ 
     #funtion to get the unique query count per page
+    @requires(dimensions=['query', 'page'])
     def uqc(self):
-        #check that we have the query dimension
-        if 'query' not in self.dimensions:
-            raise ValueError('Your report needs a query dimension to call this method.')
-        
-        if 'page' not in self.dimensions:
-            raise ValueError('Your report needs a page dimension to call this method.')
+        #we count the unique (page, query) pairs on the cached codes 
+        page_codes, pages = self._page_codes
+        query_codes, queries = self._query_codes
+        is_pair = (page_codes >= 0) & (query_codes >= 0)
+        #(deduplicated with a hash table, the pairs don't need to be sorted for bincount)
+        pairs = pd.unique(page_codes[is_pair] * len(queries) + query_codes[is_pair])
         
         return (
-            self
-            .df
-            .groupby('page', as_index=False)
-            .agg({'query': 'nunique'})
-            .rename(columns={'query': 'uqc'})
+            pd
+            .DataFrame(
+                {
+                    'page': pages, 
+                    'uqc': np.bincount(pairs // len(queries), minlength=len(pages))
+                }
+            )
             .sort_values('uqc', ascending=False)
         )
     
     #method used to classify pages based on a DataFrame with rules 
+    @requires(dimensions=['page'])
     def classify_pages(self, rules):
-        #check that we have the page dimension
-        if 'page' not in self.dimensions:
-            raise ValueError('Your report needs a page dimension to call this method.')
-        
         #check that the rules are a pandas DataFrame
         if not isinstance(rules, pd.DataFrame):
             raise ValueError('Rules must be a pandas DataFrame.')
@@ -1265,36 +1459,42 @@ class Report:
         
         
         
-        #create all the caselist for Pandas 
-        caselist=[]
-        #loop the rules to create the caselist
-        #that we will use to update the self.df object 
-        for index, row in rules.iterrows():
-            if row['type'] == 'equals':
-                caselist.append((self.df['page']==row['rule'], row['category']))
-            elif row['type'] == 'contains':
-                caselist.append((self.df['page'].str.contains(row['rule'], regex=False), row['category']))
-            elif row['type'] == 'includingRegex':
-                caselist.append((self.df['page'].str.contains(row['rule'], regex=True), row['category']))
+        #the rules are evaluated on the unique pages only 
+        #and the categories are mapped back to the rows with the page codes
+        codes, pages = self._page_codes
+        pages = pd.Series(pages)
         
-        #last rule to ensure we always have a category
-        caselist.append((self.df['page'].str.contains("http"), 'Other'))
+        #create all the conditions, in the order of the rules 
+        #(the first rule matching a page gives its category)
+        #consecutive rules of the same category are merged in a single condition:
+        #one isin for the equals rules and one compiled alternation for the other ones
+        conditions, choices = [], []
+        for category, category_rules in groupby(
+            zip(rules['category'], rules['rule'], rules['type']), 
+            key=itemgetter(0)
+        ):
+            literals, patterns = [], []
+            for _, rule, rule_type in category_rules:
+                if rule_type == 'equals':
+                    literals.append(rule)
+                elif rule_type == 'contains':
+                    patterns.append(re.escape(rule))
+                elif rule_type == 'includingRegex':
+                    patterns.append(f'(?:{rule})')
+            
+            condition = pages.isin(literals).to_numpy()
+            if patterns:
+                condition |= pages.str.contains(re.compile('|'.join(patterns))).to_numpy(dtype=bool)
+            conditions.append(condition)
+            choices.append(np.full(len(pages), category, dtype=object))
+        
+        #pages matching none of the rules (or all of them without rules) are classified as Other 
+        categories = np.full(len(pages), 'Other', dtype=object)
+        if conditions:
+            categories = np.select(conditions, choices, default=categories)
                 
         #based on these rules, we update the self.df object 
-        self_copy = deepcopy(self)
-        self_copy.df = (
-            self_copy
-            .df
-            .assign(
-                category = lambda df_:df_
-                .page
-                .case_when(
-                    caselist = caselist
-                )
-            )
-        )
-        
-        return self_copy
+        return self._assign(category = take_by_codes(categories, codes))
     
     #function to know when a page or a query was first found
     def add_first_found(self, dimension):
@@ -1307,35 +1507,22 @@ class Report:
         if 'date' not in self.dimensions:
             raise ValueError('Your report needs a date dimension to call this method.')
         
-        #create a copy of self to modify it 
-        self_copy = deepcopy(self)
-        #we create the df with the first_found column
-        first_found = (
-            self 
-            .df 
-            .assign(
-                date = lambda df_: pd.to_datetime(df_['date'])
-            )
-            .groupby(dimension, as_index=False)
-            .agg({'date': 'min'})
-            .rename(columns={'date': f'first_found_{dimension}'})
-        )
-        
-        #we merge and return the result 
-        self_copy.df = (
-            self_copy
-            .df
-            .merge(
-                first_found,
-                on=dimension,
-                how='left'
-            )
-        )
+        #the first date of each page / query is taken on the cached codes 
+        #(dates are sorted, so the smallest date code is the first date)
+        #and mapped back to the rows without merging on the strings
+        codes, uniques = self._page_codes if dimension == 'page' else self._query_codes
+        date_codes, dates = self._date_codes
+        has_key = codes >= 0
+        first_found = np.full(len(uniques), len(dates), dtype=date_codes.dtype)
+        np.minimum.at(first_found, codes[has_key], date_codes[has_key])
         
-        return self_copy
+        #create a copy of self to modify it 
+        #(NaT for the rows without a page / query)
+        return self._assign(**{f'first_found_{dimension}': take_by_codes(dates.take(first_found), codes)})
         
     #heavily inspired by https://advertools.readthedocs.io/en/master/_modules/advertools/word_frequency.html 
     #fonction to return word frequency 
+    @requires(dimensions=['query'], metrics=['clicks', 'impressions'])
     def word_frequency(
         #the df with query and the dimensions 
         self, 
@@ -1347,81 +1534,95 @@ class Report:
         rm_words=[]
     ):
         
-        #needed for part of the process 
-        from collections import defaultdict
-        
-        #we need the query dimension
-        if 'query' not in self.dimensions:
-            raise ValueError('Your report needs a query dimension to call this method.')
-        
-        #we need clicks and impressions 
-        if not all(elem in self.metrics for elem in ['clicks','impressions']):
-            raise ValueError('Your report needs clicks and impressions as metrics to call this method')
+        #the queries are tokenized once per unique query (in order of appearance in the report)
+        #with the number of rows, the clicks and the impressions of each of them
+        #(the codes in order of first appearance, found with a hash table instead of a sort)
+        #(the rows without a query are left out)
+        codes, queries = self._query_codes
+        has_query = codes >= 0
+        codes = codes[has_query]
+        order = pd.unique(codes)
+        totals = {
+            'count': np.bincount(codes, minlength=len(queries))[order],
+            **{
+                metric: np.bincount(codes, weights=self.df[metric].to_numpy()[has_query], minlength=len(queries))[order]
+                for metric in ['clicks', 'impressions']
+            }
+        }
         
         #we split using the spaces 
-        word_split = [text.lower().split() for text in self.df['query']]
-        #we also split using other delimiters we have stored 
-        word_split = [[word.strip(WORD_DELIM) for word in text] for text in word_split]
+        word_split = pd.Series(queries.take(order), dtype=object).str.lower().str.split()
+        n_words = word_split.str.len().to_numpy()
+        #we flatten the words of all the queries in a single series 
+        #and also split using other delimiters we have stored 
+        #(stripped once per unique token, the words are mapped to integer ids in order of appearance)
+        token_codes, tokens = pd.factorize(pd.Series(list(chain.from_iterable(word_split)), dtype=object))
+        word_of_token, vocabulary = pd.factorize(tokens.str.strip(WORD_DELIM))
+        word_codes = word_of_token[token_codes]
+        
+        #for each word, we know its query and its position in the query
+        row = np.repeat(np.arange(len(n_words)), n_words)
+        position = np.arange(len(word_codes)) - np.repeat(np.cumsum(n_words) - n_words, n_words)
         #we keep only the words based on our phrase_len limit 
-        word_split = [[' '.join(s[i:i + phrase_len]) for i in range(len(s) - phrase_len + 1)] for s in word_split]
-        
-        #we lower the stopwords
-        stopwords = [word.lower() for word in stopwords]
-        #we create a dictionary with the default values
-        word_freq = defaultdict(lambda: [0, 0, 0])
-        
-        #we loop our words and our values 
-        for text, clicks, impressions in zip(word_split, self.df['clicks'], self.df['impressions']):
-            for word in text:
-                if word.lower() in rm_words:
-                    continue 
-                if word.lower() in stopwords:
-                    continue
-                word_freq[word.lower()][0] += 1
-                word_freq[word.lower()][1] += clicks
-                word_freq[word.lower()][2] += impressions
-        
-        columns = ["count", "clicks", "impressions"]
-        word_freq = (
-            pd
-            .DataFrame
-            .from_dict(word_freq, columns=columns, orient="index")
+        #(the ones starting a phrase of phrase_len words within their query)
+        start = np.flatnonzero(position + phrase_len <= n_words[row])
+        
+        #phrases are mapped to integer ids (in order of appearance) from the ids of their words
+        #so the phrases are only built as strings once, for the unique ones
+        phrase_ids = word_codes[start]
+        for i in range(1, phrase_len):
+            phrase_ids, _ = pd.factorize(phrase_ids * len(vocabulary) + word_codes[start + i])
+        #the ids are numbered in order of appearance, so the first occurrence of each phrase
+        #is where the running max of the ids increases (no sort needed)
+        running_max = np.maximum.accumulate(phrase_ids)
+        first = start[np.diff(running_max, prepend=-1) > 0]
+        phrases = pd.Series(vocabulary.take(word_codes[first]), dtype=object)
+        for i in range(1, phrase_len):
+            phrases = phrases + ' ' + vocabulary.take(word_codes[first + i])
+        
+        #the values of each phrase are accumulated with bincount
+        rows = row[start]
+        word_freq = pd.DataFrame(
+            {
+                metric: (
+                    np.bincount(phrase_ids, weights=values[rows], minlength=len(phrases))
+                    .astype(np.int64 if metric == 'count' else self.df[metric].dtype)
+                )
+                for metric, values in totals.items()
+            },
+            index = pd.Index(phrases, dtype=object)
         )
+        
+        #we lower the stopwords and the custom stopwords, in a single set
+        #and remove them from the unique phrases only
+        skip = frozenset(word.lower() for word in stopwords) | frozenset(word.lower() for word in rm_words)
+        word_freq = word_freq[~word_freq.index.isin(skip)]
         return word_freq
     
     #function to get the response codes of the pages 
-    def get_response_codes(self, wait_time=0): 
+    @requires(dimensions=['page'])
+    def get_response_codes(self, wait_time=0, max_workers=16): 
         from tqdm import tqdm
-        
-        #we need the page dimension
-        if 'page' not in self.dimensions:
-            raise ValueError('Your report needs a page dimension to call this method.')
+        from concurrent.futures import ThreadPoolExecutor
         
         #we create the unique list of page s
-        pages = self.df['page'].unique().tolist()
-        #we create the dict where we'll store our results 
-        response_codes = {}
-        #we loop our pages and get  the response code 
-        #and append it to the dict 
-        for page in tqdm(pages):
-            response_codes[page] = utils.get_response_code(page)
+        codes, pages = self._page_codes
+        pages = pages.tolist()
+        
+        def get_response_code(page):
+            response_code = utils.get_response_code(page)
             if wait_time > 0:
                 time.sleep(wait_time)
+            return response_code
         
-        #we load the result into a dataframe
-        response_codes = pd.DataFrame(response_codes.items(), columns=['page', 'response_code'])
+        #the pages are requested concurrently 
+        #if we need to wait between two calls, we keep a single worker to crawl one page at a time
+        workers = 1 if wait_time > 0 else max(1, min(max_workers, len(pages)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            #we store our results in the order of the pages
+            response_codes = list(tqdm(executor.map(get_response_code, pages), total=len(pages)))
         
         #we create a copy of self to modify it 
-        self_copy = deepcopy(self)
-        self_copy.df = (
-            self_copy
-            .df
-            .merge(
-                response_codes,
-                on='page',
-                how='left'
-            )
-        )
-        
-        return self_copy
+        #the response codes are mapped back to the rows with the cached page codes
+        return self._assign(response_code = take_by_codes(response_codes, codes))
 
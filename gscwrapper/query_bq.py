@@ -1,4 +1,5 @@
 
+import time
 import pandas_gbq
 import pandas as pd 
 from . import utils
@@ -44,6 +45,9 @@ DIMENSIONS_URL = [
 #this is not from the API but we'll use it to group data by period
 PERIODS = ['D','W','M','Q','Y','QE','ME']
 
+#number of seconds the summary of the dataset (partitions) is reused before querying it again
+SUMMARY_TTL = 300
+
 #function to calculate GBQ query cost before actually running it 
 def calculate_gbq_cost(query, client):
     # Create a QueryJobConfig object and enable dry_run
@@ -55,6 +59,25 @@ def calculate_gbq_cost(query, client):
     estimated_cost = (dry_run_query_job.total_bytes_processed / (1024**4)) * 5
     return round(estimated_cost,4)
 
+#characters with a special meaning in a RE2 regex (the syntax used by BigQuery)
+RE2_SPECIAL_CHARACTERS = frozenset('\\.^$|?*+()[]{}')
+
+#brand variants are matched literally, like in Report: 
+#the RE2 special characters are escaped and the alternation is returned as a BigQuery string literal
+#(so the backslashes and the double quotes are escaped once more)
+def brand_pattern_literal(brand_variants):
+    pattern = '|'.join(
+        ''.join('\\' + char if char in RE2_SPECIAL_CHARACTERS else char for char in variant)
+        for variant in brand_variants
+    )
+    return '"' + pattern.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+#function to download the results of a query 
+#the BigQuery Storage API streams the results as Arrow record batches 
+#which is much faster than the paginated REST API for large results
+def read_gbq(query):
+    return pandas_gbq.read_gbq(query, use_bqstorage_api=True)
+
 class Query_BQ:
     def __init__(self, credentials, dataset):
         self.credentials = credentials
@@ -67,10 +90,17 @@ class Query_BQ:
         #to connect easily to BQ 
         pandas_gbq.context.credentials = self.credentials
         pandas_gbq.context.project = self.dataset.split('.')[0]
+        #summary of the partitions (and when it was downloaded) reused by range()
+        self._summary = None
+        self._summary_time = 0
     
     def data_summary(self):
+        #the partitions don't change often, the summary is reused for a few minutes
+        if self._summary is not None and time.monotonic() - self._summary_time < SUMMARY_TTL:
+            return self._summary
+        
         # The credentials and project_id arguments can be omitted.
-        df = pandas_gbq.read_gbq(
+        df = read_gbq(
             f"""
             SELECT
             table_name,
@@ -91,8 +121,14 @@ class Query_BQ:
 
             """)
         
+        self._summary, self._summary_time = df, time.monotonic()
         return df
     
+    #force the next data_summary() call to query the dataset again 
+    def invalidate_summary(self):
+        self._summary = None
+        return self 
+    
     def range(self, start=None, stop=None):
         #we must check that we are using YYYY-MM-DD format
         if start and stop:
@@ -153,6 +189,10 @@ class Report_BQ:
         self.filters = filters
         self.filters_dimensions = filters_dimensions
         self.estimate_cost = True
+        #urls of the sitemaps already downloaded, keyed by sitemap url
+        self._sitemap_urls = {}
+        #estimated costs of the queries already sent as a dry run, keyed by SQL
+        self._costs = {}
         #to connect easily to BQ 
         pandas_gbq.context.credentials = self.credentials
         pandas_gbq.context.project = self.dataset.split('.')[0]
@@ -160,6 +200,21 @@ class Report_BQ:
         #in some cases, we'll force the table anyway because we'd need specific dimensions in the report
         self.define_table_to_use()
     
+    #download the urls of a sitemap once per report 
+    #stored as a tuple so the cached list can't be modified by the caller
+    def _get_sitemap_urls(self, sitemap_url):
+        if sitemap_url not in self._sitemap_urls:
+            self._sitemap_urls[sitemap_url] = tuple(utils.get_urls_from_sitemap(sitemap_url))
+        return self._sitemap_urls[sitemap_url]
+    
+    #estimate the cost of a query once per report 
+    #the SQL is built from the dates and the filters of the report, so the same query 
+    #is estimated once instead of sending a new dry run each time
+    def _calculate_cost(self, sql):
+        if sql not in self._costs:
+            self._costs[sql] = calculate_gbq_cost(sql, self.client)
+        return self._costs[sql]
+    
     def define_table_to_use(self):
         #check if all the dimensions are in the list of dimensions for the site table 
         if all([dimension in DIMENSIONS_SITE for dimension in self.filters_dimensions]):
@@ -184,7 +239,7 @@ class Report_BQ:
                 COUNT(query) as kw_count
                 FROM `{self.dataset}.searchdata_url_impression` 
                 WHERE 
-                data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}" 
+                data_date BETWEEN DATE "{self.dates['startDate']}" and DATE "{self.dates['endDate']}" 
                 and 
                 query is not null
                 {self.filters}
@@ -203,9 +258,9 @@ class Report_BQ:
             """
     )
         if self.estimate_cost:
-            return calculate_gbq_cost(sql, self.client)
+            return self._calculate_cost(sql)
         else:
-            return pandas_gbq.read_gbq(sql)
+            return read_gbq(sql)
     
     def group_data_by_period(self, period):
         
@@ -221,7 +276,7 @@ class Report_BQ:
                 SUM(impressions) as impressions,
                 FROM `{self.dataset}.{self.table_to_use}` 
                 WHERE 
-                data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}" 
+                data_date BETWEEN DATE "{self.dates['startDate']}" and DATE "{self.dates['endDate']}" 
                 {self.filters}
                 group by data_date
             ) 
@@ -232,9 +287,9 @@ class Report_BQ:
             
             """
         if self.estimate_cost:
-            return calculate_gbq_cost(sql, self.client)
+            return self._calculate_cost(sql)
         else:
-            df = pandas_gbq.read_gbq(sql)       
+            df = read_gbq(sql)       
             return (
                 df
                 #we need to convert the date to a datetime object
@@ -255,7 +310,6 @@ class Report_BQ:
     #funtion to know if a page is active (has clicks or has impressions)
     #from a list of URLs or a sitemap
     def active_pages(self,sitemap_url=None, urls=None):
-        import numpy as np 
         
         if urls and sitemap_url: 
             raise ValueError('Please provide either sitemap_url or urls')
@@ -264,7 +318,7 @@ class Report_BQ:
         #if we have a sitemap 
         if sitemap_url:
             #download the urls from the site map
-            urls = pd.DataFrame(utils.get_urls_from_sitemap(sitemap_url), columns=['loc'])
+            urls = pd.DataFrame(self._get_sitemap_urls(sitemap_url), columns=['loc'])
         #otherwlse, just parse the list of urls
         elif urls:
             urls = (
@@ -280,41 +334,40 @@ class Report_BQ:
             SUM(clicks) as clicks
             FROM `{self.dataset}.searchdata_url_impression`
             WHERE 
-            data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}"
+            data_date BETWEEN DATE "{self.dates['startDate']}" and DATE "{self.dates['endDate']}"
             {self.filters}
             GROUP BY url
             """
         
         if self.estimate_cost:
-            return calculate_gbq_cost(sql, self.client)
+            return self._calculate_cost(sql)
         else:
-            df = pandas_gbq.read_gbq(sql)
+            df = read_gbq(sql)
             return ( 
                 df
-                #merge with our list of URLS 
-                .merge(
-                    urls,
-                    left_on = 'url',
-                    right_on = 'loc', 
-                    #we merge RIGHT 
-                    #we just want to check if the page is active
-                    #from our initial list of URLs
-                    how = 'right'
-                )
-                .filter(items=['url','clicks','impressions','loc'])
+                #we look up our list of URLs in the data (one row per url, grouped in the query)
+                #with a reindex on the url instead of a merge
+                #we just want to check if the page is active
+                #from our initial list of URLs (in the same order)
+                .set_index('url', drop=False)
+                .reindex(urls['loc'])
+                .reset_index(drop=True)
+                .filter(items=['url','clicks','impressions'])
                 .assign(
-                    active_impression = lambda df_:np.where(df_.url.isna(), False, True), 
-                    active_clicks = lambda df_:df_.url.isin(df_.query('clicks>0').url.unique()), 
-                    page = lambda df_:df_['url'].fillna(df_['loc'])
+                    active_impression = lambda df_:df_['url'].notna(), 
+                    #the clicks are already summed by url (nan if the url is not in our data)
+                    active_clicks = lambda df_:df_['clicks'] > 0, 
+                    page = lambda df_:df_['url'].fillna(urls['loc'])
                 )
-                .drop('loc', axis = 1)
                 .fillna(0)
             )
         
     
     #inspired by https://github.com/jmelm93/seo_cannibalization_analysis 
     def cannibalization(self, brand_variants):
-        
+        #the totals by page and by query are window sums over raw_data 
+        #so the table is aggregated once, without joining it back to itself
+        #(raw_data has one row per query and url, so the number of rows by query is its number of urls)
         sql = f"""
             
             WITH raw_data AS (
@@ -325,57 +378,37 @@ class Report_BQ:
                 SUM(impressions) as impressions
                 FROM `{self.dataset}.searchdata_url_impression` 
                 WHERE 
-                data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}"
+                data_date BETWEEN DATE "{self.dates['startDate']}" and DATE "{self.dates['endDate']}"
                 {self.filters}
                 and 
                 query is not null
                 and 
-                NOT regexp_contains(query, "({'|'.join(brand_variants)})")
+                NOT regexp_contains(query, {brand_pattern_literal(brand_variants)})
                 group by query, url   
                 ), 
-            data_per_page AS (
-                SELECT 
-                url as url_page, 
-                SUM(clicks) as clicks_page, 
-                SUM(impressions) as impressions_page
-                FROM raw_data
-                group by url  
-                ), 
-            data_per_query AS (
+            data_with_totals AS (
                 SELECT 
-                query as query_query, 
-                SUM(clicks) as clicks_query, 
-                SUM(impressions) as impressions_query
-                FROM raw_data
-                group by query  
+                raw_data.*, 
+                SUM(clicks) OVER (PARTITION BY url) as clicks_page, 
+                SUM(clicks) OVER (PARTITION BY query) as clicks_query
+                from raw_data
                 ), 
             important_queries AS (
                 SELECT 
-                raw_data.*, 
-                data_per_page.*,
-                data_per_query.*, 
+                data_with_totals.*, 
                 ROUND(100*SAFE_DIVIDE(clicks,clicks_page)) as clicks_pct_page,
                 ROUND(100*SAFE_DIVIDE(clicks,clicks_query)) as clicks_pct_query
-                from raw_data
-                left join data_per_page on data_per_page.url_page = raw_data.url
-                left join data_per_query on data_per_query.query_query = raw_data.query
+                from data_with_totals
                 where 
                 ROUND(100*SAFE_DIVIDE(clicks,clicks_page)) >= 10
                 AND 
                 ROUND(100*SAFE_DIVIDE(clicks,clicks_query)) >= 10
                 ), 
-            important_queries_with_more_than_one_url AS (
-                SELECT 
-                query
-                from important_queries 
-                group by query
-                HAVING COUNT(DISTINCT url) >= 2
-                ), 
             queries_to_keep AS (
                 SELECT 
-                important_queries.*
+                important_queries.*, 
+                COUNT(*) OVER (PARTITION BY query) as urls_query
                 from important_queries
-                inner join important_queries_with_more_than_one_url on important_queries_with_more_than_one_url.query = important_queries.query
                 )
 
             select 
@@ -388,86 +421,72 @@ class Report_BQ:
             clicks_pct_page, 
             clicks_pct_query, 
             from queries_to_keep
+            where urls_query >= 2
             order by query asc 
 
             """
         
         if self.estimate_cost:
-            return calculate_gbq_cost(sql, self.client)
+            return self._calculate_cost(sql)
         else:
-            df = pandas_gbq.read_gbq(sql)
+            df = read_gbq(sql)
             return df 
     
     
     def forecast(self, days):
-        from prophet import Prophet
-        
+        #we need a number of days to forecast before running the query 
+        if not isinstance(days, int) or days <= 0:
+            raise ValueError('Days must be a positive integer.')
+
         sql = f"""
             SELECT 
             data_date as ds, 
             SUM(clicks) as y
             FROM `{self.dataset}.{self.table_to_use}`
             WHERE 
-            data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}"
+            data_date BETWEEN DATE "{self.dates['startDate']}" and DATE "{self.dates['endDate']}"
             {self.filters}
             GROUP BY ds
             """
         
         if self.estimate_cost:
-            return calculate_gbq_cost(sql, self.client)
+            return self._calculate_cost(sql)
         else:
-            df = pandas_gbq.read_gbq(sql)
-            m = Prophet()
-            m.fit(df)
-            future = m.make_future_dataframe(periods=days)
-            forecast = m.predict(future)
-            return forecast 
+            df = read_gbq(sql)
+            #Prophet is only used when we have enough data to justify its cost
+            return utils.forecast_series(df, days)
     
     
     #brand vs non brand traffic evolution 
     def brand_vs_no_brand(self, brand_variants):
-        
+        #brand and no brand data are aggregated in a single scan 
+        #and the regex is only evaluated once per row
         sql = f"""
-            WITH brand AS (
-                SELECT 
-                data_date as date, 
-                SUM(clicks) as clicks,
-                SUM(impressions) as impressions, 
-                FROM `{self.dataset}.searchdata_url_impression`
-                WHERE 
-                data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}"
-                {self.filters}
-                AND 
-                REGEXP_CONTAINS(query, {'|'.join(brand_variants)})
-            ), 
-            no_brand AS (
+            SELECT 
+            date, 
+            SUM(IF(is_brand, clicks, 0)) as clicks_brand,
+            SUM(IF(is_brand, impressions, 0)) as impressions_brand,
+            SUM(IF(NOT is_brand, clicks, 0)) as clicks_no_brand,
+            SUM(IF(NOT is_brand, impressions, 0)) as impressions_no_brand
+            FROM (
                 SELECT 
                 data_date as date, 
-                SUM(clicks) as clicks,
-                SUM(impressions) as impressions, 
+                clicks, 
+                impressions, 
+                REGEXP_CONTAINS(query, {brand_pattern_literal(brand_variants)}) as is_brand
                 FROM `{self.dataset}.searchdata_url_impression`
                 WHERE 
-                data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}"
+                data_date BETWEEN DATE "{self.dates['startDate']}" and DATE "{self.dates['endDate']}"
                 {self.filters}
-                AND 
-                NOT REGEXP_CONTAINS(query, {'|'.join(brand_variants)})
             )
-                
-            
-            SELECT 
-            ISNULL(no_brand.date, brand.date) as date,
-            brand.clicks as clicks_brand,
-            brand.impressions as impressions_brand,
-            no_brand.clicks as clicks_no_brand,
-            no_brand.impressions as impressions_no_brand
-            from no_brand
-            outer join brand on brand.date = no_brand.date
+            group by date
+            order by date 
             """
             
         if self.estimate_cost:
-            return calculate_gbq_cost(sql, self.client)
+            return self._calculate_cost(sql)
         else:
-            df = pandas_gbq.read_gbq(sql)
+            df = read_gbq(sql)
             return df.fillna(0)
     
     #keyword gap
@@ -490,14 +509,14 @@ class Report_BQ:
             query
             FROM `{self.dataset}.searchdata_url_impression`
             WHERE 
-            data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}"
+            data_date BETWEEN DATE "{self.dates['startDate']}" and DATE "{self.dates['endDate']}"
             {self.filters}
             GROUP BY query
             """
         if self.estimate_cost:
-            return calculate_gbq_cost(sql, self.client)
+            return self._calculate_cost(sql)
         else:
-            df2 = pandas_gbq.read_gbq(sql)
+            df2 = read_gbq(sql)
             return (
                 df[df[keyword_column].isin(df2['query'])==False]
             )
@@ -520,15 +539,15 @@ class Report_BQ:
             SUM(clicks) as clicks
             FROM `{self.dataset}.{self.table_to_use}`
             WHERE 
-            data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}"
+            data_date BETWEEN DATE "{self.dates['startDate']}" and DATE "{self.dates['endDate']}"
             {self.filters}
             GROUP BY date
             """
         
         if self.estimate_cost:
-            return calculate_gbq_cost(sql, self.client)
+            return self._calculate_cost(sql)
         else:
-            df = pandas_gbq.read_gbq(sql)
+            df = read_gbq(sql)
             #calculate the number of days between the last data point and the intervention date 
             days = (pd.to_datetime(df['date']).max() - pd.to_datetime(intervention_date)).days
             #get the prior dates 
@@ -556,7 +575,7 @@ class Report_BQ:
             raise ValueError('Please provide a sitemap_url.')
         
         #download the urle from the sitemap
-        urls = pd.DataFrame(utils.get_urls_from_sitemap(sitemap_url), columns=['loc'])
+        urls = pd.DataFrame(self._get_sitemap_urls(sitemap_url), columns=['loc'])
         
         #get the data per page 
         sql = f"""
@@ -566,15 +585,15 @@ class Report_BQ:
             SUM(impressions) as impressions
             FROM `{self.dataset}.searchdata_url_impression`
             WHERE 
-            data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}"
+            data_date BETWEEN DATE "{self.dates['startDate']}" and DATE "{self.dates['endDate']}"
             {self.filters}
             GROUP BY url
             """
         
         if self.estimate_cost:
-            return calculate_gbq_cost(sql, self.client)
+            return self._calculate_cost(sql)
         else:
-            df = pandas_gbq.read_gbq(sql)
+            df = read_gbq(sql)
             #return the pages that are in the sitemap but below our thresholds
             return (
                 urls
@@ -603,7 +622,7 @@ class Report_BQ:
                 COUNT(query) as kw_count
                 FROM `{self.dataset}.searchdata_url_impression` 
                 WHERE 
-                data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}" 
+                data_date BETWEEN DATE "{self.dates['startDate']}" and DATE "{self.dates['endDate']}" 
                 and 
                 query is not null
                 {self.filters}
@@ -618,9 +637,9 @@ class Report_BQ:
             """
         
         if self.estimate_cost:
-            return calculate_gbq_cost(sql, self.client)
+            return self._calculate_cost(sql)
         else:
-            df = pandas_gbq.read_gbq(sql)
+            df = read_gbq(sql)
             return (
                 df
                 #we create a pivot with position as the x-axis and the yearMonth as the y-axis
@@ -643,19 +662,19 @@ class Report_BQ:
             SUM(clicks) as clicks
             FROM `{self.dataset}.searchdata_url_impression`
             WHERE 
-            data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}"
+            data_date BETWEEN DATE "{self.dates['startDate']}" and DATE "{self.dates['endDate']}"
             {self.filters}
             GROUP BY url
             """
         
         if self.estimate_cost:
-            return calculate_gbq_cost(sql, self.client)
+            return self._calculate_cost(sql)
         else:
-            df = pandas_gbq.read_gbq(sql)
+            df = read_gbq(sql)
             #check that we have a correct sitemap URL 
             if utils.check_sitemap_url(sitemap_url):
                 #download the urle from the sitemap
-                urls = pd.DataFrame(utils.get_urls_from_sitemap(sitemap_url), columns=['loc'])
+                urls = pd.DataFrame(self._get_sitemap_urls(sitemap_url), columns=['loc'])
                 
                 return (
                     df
@@ -702,7 +721,7 @@ class Report_BQ:
             SUM(clicks) as clicks
             FROM `{self.dataset}.searchdata_url_impression`
             WHERE 
-            data_date BETWEEN "{period_from[0]}" and "{period_from[1]}"
+            data_date BETWEEN DATE "{period_from[0]}" and DATE "{period_from[1]}"
             {self.filters}
             GROUP BY url
             """
@@ -713,16 +732,19 @@ class Report_BQ:
             SUM(clicks) as clicks
             FROM `{self.dataset}.searchdata_url_impression`
             WHERE 
-            data_date BETWEEN "{period_to[0]}" and "{period_to[1]}"
+            data_date BETWEEN DATE "{period_to[0]}" and DATE "{period_to[1]}"
             {self.filters}
             GROUP BY url
             """
             
         if self.estimate_cost:
-            return (calculate_gbq_cost(sql_from, self.client)+calculate_gbq_cost(sql_to, self.client))
+            return (self._calculate_cost(sql_from)+self._calculate_cost(sql_to))
         else:
-            df_from = pandas_gbq.read_gbq(sql_from)
-            df_to = pandas_gbq.read_gbq(sql_to)
+            from concurrent.futures import ThreadPoolExecutor
+            
+            #the two queries are independent: they run (and are downloaded) concurrently
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                df_from, df_to = executor.map(read_gbq, [sql_from, sql_to])
         
             return (
             #we marge the two dataframes on the page key 
@@ -755,16 +777,16 @@ class Report_BQ:
             SUM(impressions) as impressions
             FROM `{self.dataset}.searchdata_url_impression`
             WHERE 
-            data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}"
+            data_date BETWEEN DATE "{self.dates['startDate']}" and DATE "{self.dates['endDate']}"
             {self.filters}
             AND ARRAY_LENGTH(SPLIT(query, ' ')) >= {number_of_words}
             GROUP BY query
             """
         
         if self.estimate_cost:
-            return calculate_gbq_cost(sql, self.client)
+            return self._calculate_cost(sql)
         else:
-            df = pandas_gbq.read_gbq(sql)
+            df = read_gbq(sql)
             return df 
     
     
@@ -785,7 +807,7 @@ class Report_BQ:
                 SUM(impressions) as impressions
                 FROM `{self.dataset}.searchdata_url_impression` 
                 WHERE 
-                data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}"
+                data_date BETWEEN DATE "{self.dates['startDate']}" and DATE "{self.dates['endDate']}"
                 {self.filters}
                 and query is not null 
                 group by query, position 
@@ -825,9 +847,9 @@ class Report_BQ:
             
         
         if self.estimate_cost:
-            return calculate_gbq_cost(sql, self.client)
+            return self._calculate_cost(sql)
         else:
-            df = pandas_gbq.read_gbq(sql)
+            df = read_gbq(sql)
         
             return (
                 df
@@ -874,7 +896,7 @@ class Report_BQ:
                 {','.join(dimensions)}
                 FROM `{self.dataset}.{self.table_to_use}` 
                 WHERE 
-                data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}"
+                data_date BETWEEN DATE "{self.dates['startDate']}" and DATE "{self.dates['endDate']}"
                 {self.filters}
                 group by {','.join(dimensions)}
             ), 
@@ -907,9 +929,9 @@ class Report_BQ:
             """
         
         if self.estimate_cost:
-            return calculate_gbq_cost(sql, self.client)
+            return self._calculate_cost(sql)
         else:
-            df = pandas_gbq.read_gbq(sql)
+            df = read_gbq(sql)
             return df
     
     def pages_per_day(self):
@@ -920,16 +942,16 @@ class Report_BQ:
             COUNT(DISTINCT(url)) as page
             FROM `{self.dataset}.searchdata_url_impression`
             WHERE 
-            data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}"
+            data_date BETWEEN DATE "{self.dates['startDate']}" and DATE "{self.dates['endDate']}"
             {self.filters}
             GROUP BY date 
             order by date asc 
             """
         
         if self.estimate_cost:
-            return calculate_gbq_cost(sql, self.client)
+            return self._calculate_cost(sql)
         else:
-            df = pandas_gbq.read_gbq(sql)
+            df = read_gbq(sql)
             return df
     
     
@@ -942,7 +964,7 @@ class Report_BQ:
                 url, 
                 FROM `{self.dataset}.searchdata_url_impression`
                 WHERE 
-                data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}"
+                data_date BETWEEN DATE "{self.dates['startDate']}" and DATE "{self.dates['endDate']}"
                 {self.filters}
                 GROUP BY url 
             )
@@ -956,9 +978,9 @@ class Report_BQ:
             """
         
         if self.estimate_cost:
-            return calculate_gbq_cost(sql, self.client)
+            return self._calculate_cost(sql)
         else:
-            df = pandas_gbq.read_gbq(sql)
+            df = read_gbq(sql)
             return df
     
     
@@ -971,7 +993,7 @@ class Report_BQ:
             FORMAT_DATE('%A', data_date) AS date
             FROM `{self.dataset}.{self.table_to_use}`
             WHERE 
-            data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}"
+            data_date BETWEEN DATE "{self.dates['startDate']}" and DATE "{self.dates['endDate']}"
             {self.filters}
             GROUP BY 
             date
@@ -988,9 +1010,9 @@ class Report_BQ:
             """
         
         if self.estimate_cost:
-            return calculate_gbq_cost(sql, self.client)
+            return self._calculate_cost(sql)
         else:
-            df = pandas_gbq.read_gbq(sql)
+            df = read_gbq(sql)
             return df 
     
     
@@ -1005,7 +1027,7 @@ class Report_BQ:
             COUNT(DISTINCT(query)) as uqc
             FROM `{self.dataset}.searchdata_url_impression`
             WHERE 
-            data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}"
+            data_date BETWEEN DATE "{self.dates['startDate']}" and DATE "{self.dates['endDate']}"
             {self.filters}
             and query is not null
             GROUP BY 
@@ -1015,9 +1037,9 @@ class Report_BQ:
         """
         
         if self.estimate_cost:
-            return calculate_gbq_cost(sql, self.client)
+            return self._calculate_cost(sql)
         else:
-            df = pandas_gbq.read_gbq(sql)
+            df = read_gbq(sql)
             return df 
     
     
@@ -1062,7 +1084,7 @@ class Report_BQ:
                 SUM({metric}) as metric
                 FROM `{self.dataset}.searchdata_url_impression` 
                 WHERE 
-                data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}"
+                data_date BETWEEN DATE "{self.dates['startDate']}" and DATE "{self.dates['endDate']}"
                 {self.filters}
                 group by {type}, data_date
                 ),
@@ -1172,7 +1194,7 @@ class Report_BQ:
                 SUM({metric}) as metric
                 FROM `{self.dataset}.searchdata_url_impression` 
                 WHERE 
-                data_date BETWEEN "{self.dates['startDate']}" and "{self.dates['endDate']}"
+                data_date BETWEEN DATE "{self.dates['startDate']}" and DATE "{self.dates['endDate']}"
                 {self.filters}
                 group by {type}, data_date
                 ),
@@ -1252,7 +1274,7 @@ class Report_BQ:
         
         
         if self.estimate_cost:
-            return calculate_gbq_cost(sql, self.client)
+            return self._calculate_cost(sql)
         else:
-            df = pandas_gbq.read_gbq(sql)
+            df = read_gbq(sql)
             return df 
\ No newline at end of file
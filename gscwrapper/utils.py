@@ -2,16 +2,104 @@ from datetime import datetime, timedelta
 import requests
 import xml.etree.ElementTree as ET
 import validators
+import time
+from threading import Lock, local, current_thread, main_thread
+from concurrent.futures import ThreadPoolExecutor
 
 
 #function to get a response code 
+#each thread keeps its own session so the connections to the same host are reused
+_response_code_sessions = local()
+
 def get_response_code(url):
+    session = getattr(_response_code_sessions, 'session', None)
+    if session is None:
+        session = _response_code_sessions.session = requests.Session()
     try:
-        response = requests.head(url)
+        response = session.head(url)
         return response.status_code
     except: 
         return 'Impossible to get the response code'
 
+#Search Console API rate limit (queries per second), see https://developers.google.com/webmaster-tools/limits
+GSC_QPS = 10
+#max number of retries when the API answers with a rate limit error
+GSC_MAX_RETRIES = 5
+#number of pages of results requested concurrently
+GSC_MAX_WORKERS = 8
+
+#token bucket used to stay under the API rate limit
+#we only wait when the local rate would actually exceed it
+class RateLimiter:
+    def __init__(self, rate=GSC_QPS, burst=GSC_QPS):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last_refill = time.monotonic()
+        self.lock = Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            #refill the bucket based on the time elapsed since the last call
+            self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            #wait for the exact deficit if we don't have a token available
+            if self.tokens < 1:
+                time.sleep((1 - self.tokens) / self.rate)
+                self.tokens = 1
+                self.last_refill = time.monotonic()
+            self.tokens -= 1
+
+#shared by all the queries of the session
+gsc_rate_limiter = RateLimiter()
+
+#httplib2 connections are not thread safe
+#each thread gets its own connection, authorized with the same credentials
+#(the main thread keeps using the connection of the service)
+_thread_local = local()
+
+def get_thread_http(http):
+    credentials = getattr(http, 'credentials', None)
+    if credentials is None or current_thread() is main_thread():
+        return http
+    if getattr(_thread_local, 'credentials', None) is not credentials:
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+        _thread_local.http = AuthorizedHttp(credentials, http=httplib2.Http())
+        _thread_local.credentials = credentials
+    return _thread_local.http
+
+#the worker threads are kept between queries 
+#so their connections (and TLS sessions) are reused by the next calls
+_gsc_executor = None
+
+def get_gsc_executor():
+    global _gsc_executor
+    if _gsc_executor is None:
+        _gsc_executor = ThreadPoolExecutor(max_workers=GSC_MAX_WORKERS, thread_name_prefix='gsc')
+    return _gsc_executor
+
+#function to execute an API request, retrying with an exponential backoff on rate limit errors
+def execute_with_backoff(request, limiter=gsc_rate_limiter, max_retries=GSC_MAX_RETRIES, http=None):
+    from googleapiclient.errors import HttpError
+
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        try:
+            return request.execute(http=http)
+        except HttpError as e:
+            #only rate limit errors are retried (429 or 403 rateLimitExceeded)
+            is_rate_limited = e.resp.status == 429 or (
+                e.resp.status == 403 and 'ratelimitexceeded' in str(e.content).lower()
+            )
+            if not is_rate_limited or attempt == max_retries:
+                raise
+            #we use the Retry-After header when the API provides one
+            retry_after = e.resp.get('retry-after')
+            wait = float(retry_after) if retry_after and retry_after.isdigit() else min(2 ** attempt, 64)
+            time.sleep(wait)
+
 def get_date_days_ago(days=30):
     today = datetime.now()
     thirty_days_ago = today - timedelta(days)
@@ -88,6 +176,66 @@ def are_dates_parsable(date_list, date_format="%Y-%m-%d"):
     return parsable_dates
 
 
+#under this number of days, we don't use Prophet to forecast our data
+#its fit is overkill for short series and the startup cost is the dominant cost
+PROPHET_MIN_DAYS = 180
+
+#function to forecast a daily series (ds and y columns)
+#both models return the same ds / yhat columns (history + future)
+def forecast_series(df, days):
+    #for short series, a Holt-Winters model is way cheaper to fit
+    if len(df) < PROPHET_MIN_DAYS:
+        from statsmodels.tsa.holtwinters import ExponentialSmoothing
+
+        df = df.assign(ds = lambda df_: pd.to_datetime(df_['ds']))
+        #the series grouped by date in a Report is already sorted, only BigQuery results need it
+        if not df['ds'].is_monotonic_increasing:
+            df = df.sort_values('ds')
+        #we need at least two full weeks to estimate the weekly seasonality
+        seasonal = 'add' if len(df) >= 14 else None
+        model = ExponentialSmoothing(
+            df['y'].astype(float).to_numpy(),
+            seasonal=seasonal,
+            seasonal_periods=7 if seasonal else None
+        ).fit()
+        future = pd.date_range(df['ds'].max() + pd.Timedelta(days=1), periods=days, freq='D')
+        return pd.DataFrame(
+            {
+                'ds': df['ds'].tolist() + future.tolist(),
+                'yhat': list(model.fittedvalues) + list(model.forecast(days))
+            }
+        )
+
+    from prophet import Prophet
+    m = Prophet()
+    m.fit(df)
+    future = m.make_future_dataframe(periods=days)
+    return m.predict(future)[['ds', 'yhat']]
+
+
+#function used to detect content decay
+#for each group, we get its max value, the period of this max value 
+#and its value during the last period with a single sort of the data
+def decay_stats(group_ids, period_ids, values, last_period_id, n_groups):
+    import numpy as np
+
+    #sort by group, then by value (desc), then by period
+    order = np.lexsort((period_ids, -values, group_ids))
+    sorted_groups = group_ids[order]
+    #the first row of each group is its max
+    is_first = np.ones(len(order), dtype=bool)
+    is_first[1:] = sorted_groups[1:] != sorted_groups[:-1]
+    metric_max = np.zeros(n_groups, dtype=values.dtype)
+    metric_max[sorted_groups[is_first]] = values[order][is_first]
+    period_max = np.zeros(n_groups, dtype=period_ids.dtype)
+    period_max[sorted_groups[is_first]] = period_ids[order][is_first]
+    #value during the last period (nan if the group has no data for this period)
+    metric_last_period = np.full(n_groups, np.nan)
+    is_last = period_ids == last_period_id
+    metric_last_period[group_ids[is_last]] = values[is_last]
+    return metric_max, period_max, metric_last_period
+
+
 ##### DATAFORSEO #####
 from http.client import HTTPSConnection
 from base64 import b64encode
@@ -96,6 +244,8 @@ from json import dumps
 import pandas as pd 
 from tqdm import tqdm
 import time 
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 class RestClient:
     domain = "api.dataforseo.com"
@@ -141,10 +291,22 @@ def return_chunks(keywords):
     #convert clean_keywords into chunks of 1000 keywords 
     return [clean_keywords[i:i+1000] for i in range(0, len(clean_keywords), 1000)]
 
+#the list of locations barely changes, we download it once per session and credentials
+@lru_cache(maxsize=4)
+def get_location_codes(username, password):
+    r = RestClient(username, password).get('/v3/keywords_data/google_ads/locations')
+    #if we can't download the data, we stop the process (errors are not cached)
+    if r['status_code'] != 20000:
+        raise ValueError('We could not download the location data. Please check your credentials.')
+    return frozenset(location['location_code'] for location in r['tasks'][0]['result'])
+
+#number of concurrent requests sent to DataForSEO
+#each RestClient request opens its own connection, so it is safe to fan it out
+DATAFORSEO_MAX_WORKERS = 16
+
 def create_jobs_and_get_ids(chunks, tag, location, client):
     print('loading data ... ')
     dataforseo_data = []
-    task_ids = []
     for chunk in chunks:
         post_data = dict()
         # simple way to set a task
@@ -155,51 +317,57 @@ def create_jobs_and_get_ids(chunks, tag, location, client):
         )
         dataforseo_data.append(post_data)
 
-    for post_data in tqdm(dataforseo_data):
+    def submit_chunk(post_data):
         # POST /v3/keywords_data/google_ads/search_volume/task_post
-        response = client.post("/v3/keywords_data/google_ads/search_volume/task_post", post_data)
-        # you can find the full list of the response codes here https://docs.dataforseo.com/v3/appendix/errors
-        if response["status_code"] == 20000:
-            task_ids.append(response["tasks"][0]["id"])
-            pass
-        else:
-            print("error. Code: %d Message: %s" % (response["status_code"], response["status_message"]))
+        return client.post("/v3/keywords_data/google_ads/search_volume/task_post", post_data)
+
+    task_ids = []
+    #the requests are sent concurrently, we keep the order of the chunks 
+    with ThreadPoolExecutor(max_workers=DATAFORSEO_MAX_WORKERS) as executor:
+        for response in tqdm(executor.map(submit_chunk, dataforseo_data), total=len(dataforseo_data)):
+            # you can find the full list of the response codes here https://docs.dataforseo.com/v3/appendix/errors
+            if response["status_code"] == 20000:
+                task_ids.append(response["tasks"][0]["id"])
+            else:
+                print("error. Code: %d Message: %s" % (response["status_code"], response["status_message"]))
     
     return task_ids
 
-def get_search_volume(jobs_id, client):
-    #boolean to control the wile loop 
-    all_available = False 
+def get_search_volume(jobs_id, client, max_wait=15):
+    jobs_id = set(jobs_id)
+    downloaded = set()
+    futures = []
     #wait a couple of seconds before checking if the data is available
     print('Waiting a couple of seconds before checking if the data is available...')
-    time.sleep(15)
-    while all_available == False:
-        #get all available data 
-        response = client.get("/v3/keywords_data/google_ads/search_volume/tasks_ready")
-        #get the data as a dataframe
-        response_df = pd.DataFrame(response["tasks"][0]['result'])
-        #check if we have all IDs we created before 
-        if all(element in response_df.id.unique() for element in jobs_id):
-            all_available = True
-        else:
-            #if that's not the case, wait a couple of seconds before trying again 
-            print('data not available yet. Will try again in 15 seconds! Do not stop the execution.')
-            time.sleep(15)
-                
-    #download the data 
-    print('') 
-    print('downloading data...')
-    results = []
-    for task in response['tasks']:
-        if (task['result'] and (len(task['result']) > 0)):
-            for resultTaskInfo in tqdm(task['result']):            
-                if(resultTaskInfo['id']):
-                    results.append(client.get("/v3/keywords_data/google_ads/search_volume/task_get/" + resultTaskInfo['id']))
-
-        #get the data as a dataframe 
-        df = pd.DataFrame()
-        for result in results:
-            df = pd.concat([df,pd.DataFrame(result['tasks'][0]['result'])])
-            
-    return df 
+    wait = 1
+    with ThreadPoolExecutor(max_workers=DATAFORSEO_MAX_WORKERS) as executor:
+        while downloaded != jobs_id:
+            time.sleep(wait)
+            #get all available data 
+            response = client.get("/v3/keywords_data/google_ads/search_volume/tasks_ready")
+            ready = [
+                task['id']
+                for task in (response["tasks"][0]['result'] or [])
+                if task['id'] in jobs_id and task['id'] not in downloaded
+            ]
+            #we download the jobs as soon as they are ready, while we keep polling for the others
+            for task_id in ready:
+                futures.append(
+                    executor.submit(client.get, "/v3/keywords_data/google_ads/search_volume/task_get/" + task_id)
+                )
+                downloaded.add(task_id)
+            if downloaded != jobs_id:
+                #if that's not the case, we wait a bit longer before trying again 
+                wait = min(wait * 2, max_wait)
+                print('data not available yet. Will try again in {} seconds! Do not stop the execution.'.format(wait))
+        
+        print('') 
+        print('downloading data...')
+        results = [future.result() for future in tqdm(futures)]
+
+    #get the data as a dataframe 
+    return pd.concat(
+        [pd.DataFrame(result['tasks'][0]['result']) for result in results],
+        ignore_index=True
+    ) if results else pd.DataFrame()
 
@@ -11,10 +11,11 @@ setup(
           'google-auth-oauthlib>=0.2.0',
           'google.cloud==0.34.0',
           'pandas==2.2.0', 
-          'pandas_gbq==0.22.0',
+          'pandas_gbq[bqstorage]==0.22.0',
           'validators==0.23.2',
           'tqdm==4.66.1', 
           'prophet==1.1.5',
+          'statsmodels==0.14.1',
           'pycausalimpact==0.1.1', 
           'numpy==1.26.3', 
           'requests==2.31.0'
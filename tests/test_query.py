@@ -0,0 +1,81 @@
+import pytest
+
+from gscwrapper import utils
+from gscwrapper.query import Query
+
+
+class FakeRequest:
+    http = None
+
+    def __init__(self, service, body):
+        self.service = service
+        self.body = body
+
+    def execute(self, http=None):
+        self.service.start_rows.append(self.body['startRow'])
+        n_rows = max(0, min(self.body['rowLimit'], self.service.total_rows - self.body['startRow']))
+        return {
+            'rows': [
+                {'keys': [f'query {self.body["startRow"] + i}'], 'clicks': 1, 'impressions': 10}
+                for i in range(n_rows)
+            ]
+        }
+
+
+#fake Search Console service returning total_rows rows, by pages of rowLimit rows
+class FakeService:
+    def __init__(self, total_rows):
+        self.total_rows = total_rows
+        self.start_rows = []
+
+    def searchanalytics(self):
+        return self
+
+    def query(self, siteUrl, body):
+        return FakeRequest(self, body)
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    monkeypatch.setattr(utils, 'execute_with_backoff', lambda request, http=None: request.execute(http=http))
+
+
+def get(total_rows, limit=None):
+    service = FakeService(total_rows)
+    query = (
+        Query(service, 'sc-domain:example.com')
+        .range('2024-01-01', '2024-01-31')
+        .dimensions(['query'])
+    )
+    if limit:
+        query = query.limit(limit)
+    return service, query.get()
+
+
+@pytest.mark.parametrize(
+    'total_rows, n_requests',
+    [
+        #1 page: a single request
+        (10, 1),
+        #2 pages: the first page, then a wave of 2
+        (30000, 3),
+        #exactly one full page: the wave of 2 finds an empty page
+        (25000, 3),
+        #3 pages: the first page, then a wave of 2
+        (60000, 3),
+        #11 pages: waves of 2, 4 and 8 (capped by GSC_MAX_WORKERS)
+        (260000, 15),
+    ]
+)
+def test_number_of_requests(total_rows, n_requests):
+    service, report = get(total_rows)
+
+    assert len(service.start_rows) == n_requests
+    assert len(report.df) == total_rows
+
+
+def test_pages_beyond_the_limit_are_not_requested():
+    service, report = get(200000, limit=60000)
+
+    assert sorted(service.start_rows) == [0, 25000, 50000]
+    assert len(report.df) == 60000
@@ -0,0 +1,98 @@
+import pandas as pd
+import pytest
+
+from gscwrapper.query import Report
+
+
+def make_df(dtype):
+    return pd.DataFrame(
+        {
+            'date': pd.Series(['2024-01-01', '2024-01-02', '2024-01-02'], dtype=dtype),
+            'query': ['a', 'b', 'a'],
+            'device': pd.Series(['MOBILE', 'DESKTOP', 'MOBILE'], dtype=dtype),
+            'clicks': [1, 2, 3],
+            'impressions': [10, 20, 30],
+        }
+    )
+
+
+@pytest.mark.parametrize('dtype', [object, 'string'])
+def test_dates_are_parsed_whatever_the_string_dtype(dtype):
+    report = Report(make_df(dtype), 'sc-domain:example.com')
+
+    assert pd.api.types.is_datetime64_any_dtype(report.df['date'])
+    assert report.from_date == '2024-01-01'
+    assert report.to_date == '2024-01-02'
+
+
+@pytest.mark.parametrize('dtype', [object, 'string'])
+def test_low_cardinality_dimensions_are_categories_whatever_the_string_dtype(dtype):
+    report = Report(make_df(dtype), 'sc-domain:example.com')
+
+    assert isinstance(report.df['device'].dtype, pd.CategoricalDtype)
+    assert sorted(report.df['device'].cat.categories) == ['DESKTOP', 'MOBILE']
+
+
+def test_unused_categories_are_removed_after_a_filter():
+    report = Report(make_df(object), 'sc-domain:example.com').filter('clicks > 1')
+
+    assert list(report.df['device'].cat.categories) == ['DESKTOP', 'MOBILE']
+    assert list(report.filter('device == "MOBILE"').df['device'].cat.categories) == ['MOBILE']
+
+
+def test_seasonality_per_day_is_ordered_from_monday_to_sunday():
+    df = make_df(object).assign(page='https://example.com/')
+    seasonality = Report(df, 'sc-domain:example.com').seasonality_per_day()
+
+    assert list(seasonality.sort_index().index) == [
+        'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'
+    ]
+
+
+def make_df_with_missing_keys():
+    #'zz c' and page-b are the last keys of the sorted factorizations
+    return pd.DataFrame(
+        {
+            'date': ['2024-01-01', '2024-01-02', '2024-01-02', '2024-01-03'],
+            'query': ['a b', None, 'zz c', 'zz c'],
+            'page': ['https://example.com/a', 'https://example.com/a', None, 'https://example.com/b'],
+            'clicks': [1, 2, 3, 4],
+            'impressions': [10, 20, 30, 40],
+            'position': [1.0, 2.0, 3.0, 4.0],
+        }
+    )
+
+
+def test_missing_queries_and_pages_are_left_out_of_the_aggregations():
+    report = Report(make_df_with_missing_keys(), 'sc-domain:example.com')
+
+    uqc = report.uqc().set_index('page')['uqc']
+    assert uqc.to_dict() == {'https://example.com/a': 1, 'https://example.com/b': 1}
+    assert set(report.find_ctr_outliers()['query']) <= {'a b', 'zz c'}
+    word_freq = report.word_frequency(stopwords=[])
+    assert word_freq.loc['zz', 'count'] == 2
+    assert word_freq['clicks'].sum() == 1 + 1 + 3 + 4 + 3 + 4
+    assert report.pages_lifespan()['count'].sum() == 2
+
+
+def test_missing_queries_and_pages_are_not_mapped_to_the_last_key():
+    report = Report(make_df_with_missing_keys(), 'sc-domain:example.com')
+
+    assert list(report.find_long_tail_keywords(2)['clicks']) == [1, 3, 4]
+    replaced = report.replace_query_from_list(['zz'])['query_replaced']
+    assert replaced.isna().tolist() == [False, True, False, False]
+    assert pd.isna(report.add_first_found('query').df['first_found_query'][1])
+    assert pd.isna(report.add_first_found('page').df['first_found_page'][2])
+    brand = report.brand_vs_no_brand(['zz'])
+    assert brand['clicks_brand'].tolist() == [0, 3, 4]
+    assert brand['clicks_no_brand'].tolist() == [1, 2, 0]
+
+
+def test_url_to_df_does_not_modify_the_dataframe_of_the_caller():
+    #no conversion is needed, so the setter has nothing to assign
+    df = make_df_with_missing_keys().assign(date=lambda df_: pd.to_datetime(df_['date']))
+    columns = list(df.columns)
+    report = Report(df, 'sc-domain:example.com').url_to_df()
+
+    assert list(df.columns) == columns
+    assert 'netloc' in report.df.columns
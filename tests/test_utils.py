@@ -0,0 +1,23 @@
+import pandas as pd
+import pytest
+
+from gscwrapper import utils
+
+
+def make_series(days):
+    return pd.DataFrame(
+        {
+            'ds': pd.date_range('2024-01-01', periods=days, freq='D'),
+            'y': [10 + day % 7 for day in range(days)],
+        }
+    )
+
+
+@pytest.mark.parametrize('days', [30, utils.PROPHET_MIN_DAYS])
+def test_forecast_series_returns_the_same_columns_with_both_models(days):
+    if days >= utils.PROPHET_MIN_DAYS:
+        pytest.importorskip('prophet')
+    forecast = utils.forecast_series(make_series(days), 10)
+
+    assert list(forecast.columns) == ['ds', 'yhat']
+    assert len(forecast) == days + 10